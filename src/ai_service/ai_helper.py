@@ -1,88 +1,267 @@
-import pdfplumber
 import pandas as pd
 import fitz
+from PIL import Image, ImageOps
+from python_calamine import CalamineWorkbook
 import os
 import logging
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+from io import BytesIO
+
+from src.core.conf import DOCVISION_IO_WORKERS, DOCVISION_NETWORK_WORKERS
+from src.utils.pdf_extractor import file_signature
 
 logger = logging.getLogger("DocVision")
 
+PDF_PAGE_BATCH = 10
+EXCEL_MAX_ROWS = 100
+PAGE_JPEG_QUALITY = 85
+# Pages rendered for the model (JPEG bytes); enough for OCR at a fraction of the 2x PNG size
+PAGE_JPEG_DPI = 150
+PDF_MAX_WORKERS = min(10, os.cpu_count() or 1)
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+# Shared by the OpenAI and Gemini paths so blocking image/PDF/Excel work competes for one budget
+io_pool = ThreadPoolExecutor(max_workers=DOCVISION_IO_WORKERS, thread_name_prefix="docvision")
+# Blocking SDK requests mostly wait on the network; keeping them off io_pool means a
+# few slow model calls can't starve file work, and small hosts still run many at once
+network_pool = ThreadPoolExecutor(max_workers=DOCVISION_NETWORK_WORKERS, thread_name_prefix="docvision-net")
+
+
+async def run_in_io_pool(func, /, *args, **kwargs):
+    """Run a blocking call on the shared worker pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_pool, partial(func, *args, **kwargs))
+
+
+async def run_in_network_pool(func, /, *args, **kwargs):
+    """Run a blocking model SDK request on the network pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(network_pool, partial(func, *args, **kwargs))
 
-def extract_text_from_pdf(file_path):
-    text = ""
-    with pdfplumber.open(file_path) as pdf:
-        for page in pdf.pages:
-            lines = page.extract_text().split("\n")  # split text into lines
-            for line in lines:
-                for word in line.split(" "):
-                    text += word + " "
-                text += "\n"
-    return text
 
+def _get_pdf_pool():
+    """Lazily create the shared page-processing pool.
 
-def save_pdf_as_images(pdf_path, output_dir=None):
-    """Convert PDF to images and save them (testing purposes only)"""
+    PyMuPDF holds the GIL and a Document must not be shared between threads,
+    so pages are fanned out to worker processes that each open the file.
+    """
+    global _pdf_pool
+    if _pdf_pool is None:
+        with _pdf_pool_lock:
+            if _pdf_pool is None:
+                _pdf_pool = ProcessPoolExecutor(
+                    max_workers=PDF_MAX_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pdf_pool
+
+
+def shutdown_pdf_pool():
+    """Stop the page-processing worker processes, if they were started"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown(wait=False, cancel_futures=True)
+            _pdf_pool = None
+
+
+def _page_batches(page_count):
+    return [range(start, min(start + PDF_PAGE_BATCH, page_count))
+            for start in range(0, page_count, PDF_PAGE_BATCH)]
+
+
+def _extract_pages_text(file_path, pages):
+    doc = fitz.open(file_path)
     try:
-        if not output_dir:
-            base_name = os.path.splitext(os.path.basename(pdf_path))[0]
-            output_dir = f"{base_name}_images"
-        
-        os.makedirs(output_dir, exist_ok=True)
-        
-        doc = fitz.open(pdf_path)
-        saved_files = []
-        
-        for page_num in range(len(doc)):  # Process all pages
-            page = doc[page_num]
+        return [doc[page_num].get_text("text") for page_num in pages]
+    finally:
+        doc.close()
+
+
+def _render_pages(pdf_path, output_dir, pages):
+    """Render pages to PNG files in output_dir, or to JPEG bytes if output_dir is None"""
+    doc = fitz.open(pdf_path)
+    try:
+        rendered = []
+        for page_num in pages:
+            if output_dir is None:
+                pix = doc[page_num].get_pixmap(dpi=PAGE_JPEG_DPI)
+                rendered.append(pix.tobytes("jpeg", jpg_quality=PAGE_JPEG_QUALITY))
+                continue
             # High quality conversion
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x scaling
+            pix = doc[page_num].get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x scaling
             output_path = os.path.join(output_dir, f"page_{page_num + 1}.png")
             pix.save(output_path)
-            saved_files.append(output_path)
-            logger.info(f"Saved: {output_path}")
-        
+            rendered.append(output_path)
+        return rendered
+    finally:
         doc.close()
-        logger.info(f"Converted {len(saved_files)} pages to {output_dir}/")
-        return saved_files
+
+
+def extract_text_from_pdf(file_path, max_chars=None):
+    """Extract plain text from PDF pages (line-split, one page after another).
+
+    Results are memoized per file signature (path, mtime, size).
+
+    Args:
+        file_path: Path to the PDF file.
+        max_chars: If given, stop reading pages once this many characters
+            are collected and return at most that many.
+    """
+    return _extract_text_from_pdf(*file_signature(file_path), max_chars)
+
+
+@lru_cache(maxsize=32)
+def _extract_text_from_pdf(file_path, _mtime_ns, _size, max_chars):
+    with fitz.open(file_path) as doc:
+        page_count = doc.page_count
+        if max_chars is not None:
+            parts = []
+            collected = 0
+            for page in doc:
+                text = page.get_text("text")
+                parts.append(text)
+                collected += len(text) + 1
+                if collected >= max_chars:
+                    break
+            return "\n".join(parts)[:max_chars]
+        if page_count <= PDF_PAGE_BATCH:
+            return "\n".join(page.get_text("text") for page in doc)
+
+    batches = _page_batches(page_count)
+    results = _get_pdf_pool().map(_extract_pages_text, [file_path] * len(batches), batches)
+    return "\n".join(text for batch in results for text in batch)
+
+
+def save_pdf_as_images(pdf_path, output_dir=None, return_bytes=False, max_pages=None):
+    """
+    Convert PDF pages to images.
+
+    Args:
+        pdf_path: Path to the PDF file.
+        output_dir: Directory for the PNG files (testing purposes only).
+        return_bytes: Return in-memory JPEG bytes per page instead of writing files.
+        max_pages: Only convert the first max_pages pages.
+
+    Returns:
+        List of saved file paths, or of JPEG bytes if return_bytes is set.
+    """
+    try:
+        if return_bytes:
+            output_dir = None
+        else:
+            if not output_dir:
+                base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+                output_dir = f"{base_name}_images"
+            os.makedirs(output_dir, exist_ok=True)
+
+        with fitz.open(pdf_path) as doc:
+            page_count = doc.page_count
+        if max_pages is not None:
+            page_count = min(page_count, max_pages)
+
+        batches = _page_batches(page_count)
+        if len(batches) <= 1:
+            rendered = _render_pages(pdf_path, output_dir, range(page_count))
+        else:
+            results = _get_pdf_pool().map(
+                _render_pages, [pdf_path] * len(batches), [output_dir] * len(batches), batches
+            )
+            rendered = [page for batch in results for page in batch]
+
+        if output_dir is not None:
+            logger.info(f"Converted {len(rendered)} pages to {output_dir}/")
+        return rendered
         
     except Exception as e:
         logger.error(f"Error: {e}")
         return []
 
+def prepare_image_for_model(image_path, max_side):
+    """
+    Downscale an image to the model's effective resolution and re-encode as JPEG.
+
+    Args:
+        image_path: Path to the source image.
+        max_side: Longest side in pixels after resizing (never upscales).
+
+    Returns:
+        JPEG bytes.
+    """
+    with Image.open(image_path) as img:
+        # Let the JPEG decoder scale down during decode (no-op for other formats)
+        img.draft("RGB", (max_side, max_side))
+        # Re-encoding drops the EXIF orientation tag, so rotate the pixels upright first
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_side, max_side))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+
+        buffer = BytesIO()
+        img.save(buffer, format="JPEG", quality=PAGE_JPEG_QUALITY)
+        return buffer.getvalue()
+
+
+IMAGE_TYPES = frozenset({'jpg', 'jpeg', 'png', 'gif', 'webp'})
+EXCEL_TYPES = frozenset({'xlsx', 'xls', 'csv'})
+
+
 def get_file_type(file_name):
     """Determine file type based on extension"""
-    extension = file_name.lower().split('.')[-1]
-    
-    image_types = ['jpg', 'jpeg', 'png', 'gif', 'webp']
-    pdf_types = ['pdf']
-    excel_types = ['xlsx', 'xls', 'csv']
-    
-    if extension in image_types:
+    extension = file_name[file_name.rfind('.') + 1:].lower()
+
+    if extension in IMAGE_TYPES:
         return 'image', f'image/{extension if extension != "jpg" else "jpeg"}'
-    elif extension in pdf_types:
+    elif extension == 'pdf':
         return 'pdf', None
-    elif extension in excel_types:
+    elif extension in EXCEL_TYPES:
         return 'excel', None
     else:
         return 'unknown', None
 
+def _count_data_rows(file_path, extension):
+    """Count data rows without building a dataframe"""
+    try:
+        if extension == 'csv':
+            with open(file_path, 'rb') as f:
+                return sum(1 for _ in f) - 1
+        sheet = CalamineWorkbook.from_path(file_path).get_sheet_by_index(0)
+        return sheet.total_height - 1
+    except Exception as e:
+        logger.warning(f"Could not count rows in {file_path}: {e}")
+    return None
+
+
 def extract_text_from_excel(file_path):
     """Extract text from Excel/CSV files"""
     try:
         extension = file_path.lower().split('.')[-1]
-        
+
+        # Read one row past the limit only to know whether there is more
         if extension == 'csv':
-            df = pd.read_csv(file_path)
+            df = pd.read_csv(file_path, nrows=EXCEL_MAX_ROWS + 1)
         else:  # xlsx, xls
-            df = pd.read_excel(file_path)
-        
+            df = pd.read_excel(file_path, nrows=EXCEL_MAX_ROWS + 1, engine="calamine")
+
+        truncated = len(df) > EXCEL_MAX_ROWS
+        if truncated:
+            df = df.head(EXCEL_MAX_ROWS)
+
         # Convert dataframe to readable text format
-        text = ""
+        text = df.to_string(index=False, max_rows=50)  # Limit rows to avoid token limits
+
+        if truncated:
+            total_rows = _count_data_rows(file_path, extension)
+            if total_rows is None:
+                return f"{text}\n\n... (showing first {EXCEL_MAX_ROWS} rows)"
+            return f"{text}\n\n... (showing first {EXCEL_MAX_ROWS} rows out of {total_rows} total rows)"
 
-        text += df.to_string(index=False, max_rows=50)  # Limit rows to avoid token limits
-        
-        if len(df) > 100:
-            text += f"\n\n... (showing first 100 rows out of {len(df)} total rows)"
-            
         return text
     except Exception as e:
         logger.error(f"Error extracting Excel/CSV text: {e}")
@@ -1,16 +1,24 @@
-import asyncio
-import json
 import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Optional
+
+import fitz
 import google.generativeai as genai
-from PIL import Image
+import orjson
+from google.generativeai import caching
 from fastapi import HTTPException
 from google.api_core.exceptions import GoogleAPIError
 from starlette.status import HTTP_400_BAD_REQUEST, HTTP_500_INTERNAL_SERVER_ERROR
 
-from src.ai_service.ai_helper import extract_text_from_pdf
+from src.ai_service.ai_helper import extract_text_from_pdf, save_pdf_as_images, prepare_image_for_model, \
+    run_in_network_pool
+from src.ai_service.response_cache import response_cache_key, text_cache_key, cached_response
 from src.core.conf import GEMINI_API_KEY
-from src.ai_service.prompt import AI_PROMPT_EXCEL_COLUMN_MAPPING, prompt_common_rules, \
+from src.ai_service.prompt import excel_column_mapping_prompt, prompt_common_rules, \
     AI_PROMPT_PDF_COLUMN_MAPPING, AI_PROMPT_PDF_UNSTRUCTURED_EXTRACTION, prompt_header_image, format_match_prompt
 
 from src.utils.pdf_extractor import extract_pdf_tables_to_tuples, parse_string_to_list, map_ai_response_to_dicts
@@ -20,16 +28,88 @@ logger = logging.getLogger("DocVision")
 # Configure API
 genai.configure(api_key=GEMINI_API_KEY)
 
+MODEL_NAME = "gemini-2.5-flash"
+
+
+@lru_cache(maxsize=4)
+def _get_model(model_name: str) -> genai.GenerativeModel:
+    """Return a shared model instance per model name"""
+    return genai.GenerativeModel(model_name)
+
+
 # Initialize model
-model = genai.GenerativeModel("gemini-2.5-flash")
+model = _get_model(MODEL_NAME)
+
 
+def warm_up_gemini_client() -> None:
+    """
+    Open the SDK's shared connection before the first user request.
 
-async def extract_data(file_path: str) -> dict:
+    genai keeps one default client (a multiplexed HTTP/2 gRPC channel) for the
+    whole process; every model and request reuses it. Fetching the model's
+    metadata once at startup pays DNS, TLS and channel setup up front instead
+    of on the first extraction.
+    """
+    try:
+        genai.get_model(f"models/{MODEL_NAME}")
+        logger.info("Gemini client connection warmed up")
+    except Exception as e:
+        logger.warning(f"Gemini warm-up failed, first request will connect lazily: {e}")
+
+# Context caching: static prompt prefixes are stored on Gemini's side once and
+# referenced by handle, so only the per-file part is sent with each request.
+# Bump CACHE_VERSION whenever one of the cached prompts changes.
+CACHE_VERSION = "v1"
+PROMPT_CACHE_TTL = timedelta(hours=1)
+PROMPT_CACHE_REFRESH_MARGIN = timedelta(minutes=5)
+
+CACHED_PROMPTS = {
+    "pdf_structured": AI_PROMPT_PDF_COLUMN_MAPPING,
+    "pdf_unstructured": AI_PROMPT_PDF_UNSTRUCTURED_EXTRACTION,
+    "image": f"{prompt_header_image}{prompt_common_rules}",
+}
+
+_prompt_caches: dict[str, tuple[caching.CachedContent, genai.GenerativeModel]] = {}
+_prompt_cache_failures: dict[str, datetime] = {}
+_prompt_cache_lock = threading.Lock()
+
+# Fixed headers around the per-file part of PDF prompts
+_PDF_TEXT_HEADER = "\nHere's unstructured data as text:\n"
+_PDF_TOP_ROWS_HEADER = "\nHere's top 10 rows from the PDF data:\n"
+_PDF_BOTTOM_ROWS_HEADER = "\nHere's bottom 5 rows from the PDF data:\n"
+_PDF_ALL_ROWS_HEADER = "\nHere's PDF data:\n"
+
+# Scanned PDFs up to these limits go inline in one request (Gemini's inline
+# request limit is 20 MB); larger ones are sent page by page, concurrently.
+# Page requests get their own pool: they are submitted from a task already
+# running on network_pool, and waiting on the same pool could deadlock it.
+INLINE_PDF_MAX_BYTES = 18 * 1024 * 1024
+INLINE_PDF_MAX_PAGES = 5
+SCANNED_PDF_MAX_PAGES = 30
+_page_request_pool = ThreadPoolExecutor(max_workers=10, thread_name_prefix="gemini-page")
+
+# Images are downscaled to the model's effective input resolution before upload
+GEMINI_IMAGE_MAX_SIDE = 1568
+
+# Supported image formats
+IMAGE_FORMATS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.heic', '.heif'})
+
+
+async def extract_data(
+    file_path: str,
+    content_hash: Optional[str] = None,
+    user_id: Optional[str] = None
+) -> dict:
     """
     Async function to extract data from PDF or image file.
 
+    Successful results are cached by file content and prompt version, so
+    re-uploading the same file skips the model round-trip.
+
     Args:
         file_path: Path to the PDF or image file
+        content_hash: Precomputed hash of the upload; the file is hashed if omitted
+        user_id: Owner of the upload; cached results are not shared across users
 
     Returns:
         Extracted data as dictionary
@@ -46,19 +126,26 @@ async def extract_data(file_path: str) -> dict:
     _, ext = os.path.splitext(file_path)
     ext = ext.lower()
 
-    # Supported image formats
-    image_formats = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.heic', '.heif']
+    if ext == '.pdf' or ext in IMAGE_FORMATS:
+        prompt_types = ("pdf_structured", "pdf_unstructured", "image") if ext == '.pdf' else ("image",)
+        prompt_fingerprint = "\0".join([MODEL_NAME, *(CACHED_PROMPTS[t] for t in prompt_types)])
+        cache_key = await response_cache_key(file_path, prompt_fingerprint, content_hash)
+        return await cached_response(cache_key, lambda: _extract_data(file_path, ext), scope=user_id)
 
+    return await _extract_data(file_path, ext)
+
+
+async def _extract_data(file_path: str, ext: str) -> dict:
+    """Run the model extraction for a file (uncached)."""
     try:
         if ext == '.pdf':
             # Process PDF
-            result = await asyncio.to_thread(_extract_from_pdf, file_path)
-        elif ext in image_formats:
-            prompt = f"{prompt_header_image}{prompt_common_rules}"
+            result = await run_in_network_pool(_extract_from_pdf, file_path)
+        elif ext in IMAGE_FORMATS:
             # Process Image
-            result = await asyncio.to_thread(_extract_from_image, file_path, prompt)
+            result = await run_in_network_pool(_extract_from_image, file_path)
         else:
-            err_msg = f"Unsupported file format: {ext}. Supported formats: PDF, {', '.join(image_formats)}"
+            err_msg = f"Unsupported file format: {ext}. Supported formats: PDF, {', '.join(sorted(IMAGE_FORMATS))}"
             logger.error(err_msg)
             raise HTTPException(
                 status_code=HTTP_400_BAD_REQUEST,
@@ -85,27 +172,39 @@ async def extract_data(file_path: str) -> dict:
 
 async def detect_excel_columns_gemini(
     excel_text: str,
-    prompt: str = AI_PROMPT_EXCEL_COLUMN_MAPPING,
-    model_name: str = "gemini-2.5-flash"
+    prompt: Optional[str] = None,
+    model_name: str = MODEL_NAME
 ) -> dict:
     """
     Uses Gemini 2.5 Flash to detect and map Excel columns from given text data.
 
     Args:
-        prompt (str): Instruction text for the model.
+        prompt (str): Instruction text for the model (default: the column-mapping prompt).
         excel_text (str): Top rows of Excel formatted as plain text.
         model_name (str): Gemini model name (default: gemini-2.5-flash).
 
     Returns:
         dict: Parsed JSON result with columns, irrelevant_columns, irrelevant_rows.
     """
+    if prompt is None:
+        prompt = excel_column_mapping_prompt()
+
+    # Many uploads share the same template spreadsheet, so identical top rows
+    # reuse the earlier mapping instead of paying for another model call
+    cache_key = text_cache_key(excel_text, f"{model_name}\0{prompt}")
+    return await cached_response(
+        cache_key,
+        lambda: _detect_excel_columns_gemini(excel_text, prompt, model_name)
+    )
 
+
+async def _detect_excel_columns_gemini(excel_text: str, prompt: str, model_name: str) -> dict:
+    """Run the column-detection request (uncached)."""
     user_prompt = f"{prompt}\n\nHere are the top rows from the Excel file:\n\n{excel_text}"
 
     try:
-        model_instance = genai.GenerativeModel(model_name)
-        response = await asyncio.to_thread(
-            model_instance.generate_content,
+        response = await run_in_network_pool(
+            _get_model(model_name).generate_content,
             user_prompt,
             generation_config=genai.types.GenerationConfig(
                 temperature=0,
@@ -117,10 +216,10 @@ async def detect_excel_columns_gemini(
         result_text = response.text.strip() if response.text else ""
 
         try:
-            result = json.loads(result_text)
+            result = orjson.loads(result_text)
             return {"ok": True, "result": result}
 
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             logger.warning("⚠️ Warning: Gemini returned invalid JSON, returning raw text.")
             return {"ok": False, "error": result_text}
 
@@ -135,7 +234,7 @@ async def detect_excel_columns_gemini(
 async def ai_match_products(not_matched_items: str, found_result: str) -> dict | list:
     prompt = format_match_prompt(not_matched_items, found_result)
     try:
-        response = await asyncio.to_thread(
+        response = await run_in_network_pool(
             model.generate_content,
             prompt,
             generation_config=genai.types.GenerationConfig(
@@ -165,12 +264,104 @@ async def ai_match_products(not_matched_items: str, found_result: str) -> dict |
             detail=error_message
         )
 
-def _extract_from_image(image_path: str, prompt: str) -> str:
+def _get_cached_model(prompt_type: str) -> genai.GenerativeModel | None:
+    """
+    Return a model bound to the cached prompt prefix for the given prompt type.
+
+    The cache is created on first use and re-created when it is about to expire.
+    Returns None if context caching is unavailable (e.g. the prompt is below the
+    minimum cacheable size), in which case the caller must send the full prompt.
+    """
+    cache_key = f"{CACHE_VERSION}:{prompt_type}"
+    now = datetime.now(timezone.utc)
+
+    with _prompt_cache_lock:
+        cached = _prompt_caches.get(cache_key)
+        if cached and cached[0].expire_time - now > PROMPT_CACHE_REFRESH_MARGIN:
+            return cached[1]
+
+        failed_at = _prompt_cache_failures.get(cache_key)
+        if failed_at and now - failed_at < PROMPT_CACHE_TTL:
+            return None
+
+        try:
+            cache = caching.CachedContent.create(
+                model=MODEL_NAME,
+                display_name=f"docvision-{prompt_type}-{CACHE_VERSION}",
+                contents=[CACHED_PROMPTS[prompt_type]],
+                ttl=PROMPT_CACHE_TTL,
+            )
+        except Exception as e:
+            logger.warning(f"Context cache unavailable for '{prompt_type}', sending full prompt: {e}")
+            _prompt_caches.pop(cache_key, None)
+            _prompt_cache_failures[cache_key] = now
+            return None
+
+        cached_model = genai.GenerativeModel.from_cached_content(cached_content=cache)
+        _prompt_caches[cache_key] = (cache, cached_model)
+        _prompt_cache_failures.pop(cache_key, None)
+        return cached_model
+
+
+def _generate_with_cached_prompt(prompt_type: str, contents: list):
+    """Send only the per-file contents when the static prompt prefix is cached"""
+    cached_model = _get_cached_model(prompt_type)
+    if cached_model is not None:
+        return cached_model.generate_content(contents)
+
+    return model.generate_content([CACHED_PROMPTS[prompt_type], *contents])
+
+
+def _extract_from_image(image_path: str) -> str:
     """Helper function to extract data from image"""
-    img = Image.open(image_path)
-    response = model.generate_content([prompt, img])
+    image_bytes = prepare_image_for_model(image_path, GEMINI_IMAGE_MAX_SIDE)
+    response = _generate_with_cached_prompt("image", [{"mime_type": "image/jpeg", "data": image_bytes}])
     return parse_string_to_list(response.text)
 
+def _extract_from_blob(data: bytes, mime_type: str = "image/jpeg") -> list:
+    """
+    Extract items from an inline document blob (rendered page or whole PDF).
+
+    Request errors propagate: a page that silently came back empty would make the
+    whole result look complete, and complete results are cached.
+    """
+    response = _generate_with_cached_prompt("image", [{"mime_type": mime_type, "data": data}])
+    result = parse_string_to_list((response.text or "").strip())
+    return result if isinstance(result, list) else []
+
+
+def shutdown_page_request_pool():
+    """Stop the scanned-page request threads (called from the app lifespan)"""
+    _page_request_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _extract_from_scanned_pdf(pdf_path: str) -> list:
+    """
+    Extract a PDF without a text layer.
+
+    Short, small files are sent inline as application/pdf in a single request;
+    longer ones are rendered to JPEG pages and extracted concurrently, keeping
+    page order.
+    """
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+    if page_count <= INLINE_PDF_MAX_PAGES and os.path.getsize(pdf_path) <= INLINE_PDF_MAX_BYTES:
+        with open(pdf_path, "rb") as f:
+            return _extract_from_blob(f.read(), "application/pdf")
+
+    if page_count > SCANNED_PDF_MAX_PAGES:
+        logger.warning(
+            f"Scanned PDF {pdf_path} has {page_count} pages, extracting only the first {SCANNED_PDF_MAX_PAGES}"
+        )
+
+    pages = save_pdf_as_images(pdf_path, return_bytes=True, max_pages=SCANNED_PDF_MAX_PAGES)
+
+    items = []
+    for page_items in _page_request_pool.map(_extract_from_blob, pages):
+        items.extend(page_items)
+    return items
+
+
 def _extract_from_pdf(pdf_path: str) -> list:
     """Helper function to extract structured or unstructured data from PDF."""
     rows_as_list_of_tuples = extract_pdf_tables_to_tuples(pdf_path)
@@ -178,13 +369,14 @@ def _extract_from_pdf(pdf_path: str) -> list:
 
     # 1️⃣ No tables detected — use unstructured extraction
     if rows_length == 0:
-        pdf_content = extract_text_from_pdf(pdf_path)
-        prompt = f"""{AI_PROMPT_PDF_UNSTRUCTURED_EXTRACTION}
-Here's unstructured data as text:
-{pdf_content[:5000]}
-"""
+        pdf_content = extract_text_from_pdf(pdf_path, max_chars=5000)
+        if not pdf_content.strip():
+            # No text layer (scanned PDF) — read the pages as images instead
+            return _extract_from_scanned_pdf(pdf_path)
+
+        prompt = f"{_PDF_TEXT_HEADER}{pdf_content}\n"
         try:
-            response = model.generate_content([prompt])
+            response = _generate_with_cached_prompt("pdf_unstructured", [prompt])
             result = (response.text or "").strip()
             return parse_string_to_list(result)
         except Exception as e:
@@ -193,22 +385,17 @@ Here's unstructured data as text:
 
     # 2️⃣ Many rows — send only top/bottom parts
     if rows_length > 15:
-        prompt = f"""{AI_PROMPT_PDF_COLUMN_MAPPING}
-Here's top 10 rows from the PDF data:
-{"\n".join(str(row) for row in rows_as_list_of_tuples[:10])}
-Here's bottom 5 rows from the PDF data:
-{"\n".join(str(row) for row in rows_as_list_of_tuples[-5:])}
-"""
+        top_rows = "\n".join(map(str, rows_as_list_of_tuples[:10]))
+        bottom_rows = "\n".join(map(str, rows_as_list_of_tuples[-5:]))
+        prompt = f"{_PDF_TOP_ROWS_HEADER}{top_rows}{_PDF_BOTTOM_ROWS_HEADER}{bottom_rows}\n"
     else:
         # 3️⃣ Small dataset — send all rows
-        prompt = f"""{AI_PROMPT_PDF_COLUMN_MAPPING}
-Here's PDF data:
-{"\n".join(str(row) for row in rows_as_list_of_tuples)}
-"""
+        all_rows = "\n".join(map(str, rows_as_list_of_tuples))
+        prompt = f"{_PDF_ALL_ROWS_HEADER}{all_rows}\n"
 
-    # 4️⃣ Send prompt to model
+    # 4️⃣ Send prompt to model (static column-mapping instructions come from the context cache)
     try:
-        response = model.generate_content([prompt])
+        response = _generate_with_cached_prompt("pdf_structured", [prompt])
         eval_response = parse_string_to_list((response.text or "").strip())
         if not eval_response:
             return []
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Coroutine
+
+from fastapi import HTTPException, status
+
+logger = logging.getLogger("DocVision")
+
+# Every queued job keeps its upload (up to MAX_UPLOAD_SIZE) in memory until it finishes,
+# so beyond these a new job is refused (429) instead of started
+AI_JOB_MAX_RUNNING = 50
+AI_JOB_MAX_PER_USER = 3
+
+# Strong references to running jobs, so the event loop cannot garbage-collect them mid-run
+_ai_jobs: set[asyncio.Task] = set()
+# Reserved or running jobs, in total and per user
+_active_jobs = 0
+_jobs_per_user: Counter = Counter()
+
+
+def reserve_ai_job(user_id: str) -> None:
+    """Take a job slot, or refuse with HTTP 429 if the global or per-user limit is reached"""
+    global _active_jobs
+    if _active_jobs >= AI_JOB_MAX_RUNNING or _jobs_per_user[user_id] >= AI_JOB_MAX_PER_USER:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many documents are being processed, please try again shortly",
+            headers={"Retry-After": "5"}
+        )
+    _active_jobs += 1
+    _jobs_per_user[user_id] += 1
+
+
+def release_ai_job(user_id: str) -> None:
+    """Give back a slot taken by reserve_ai_job"""
+    global _active_jobs
+    _active_jobs -= 1
+    _jobs_per_user[user_id] -= 1
+    if _jobs_per_user[user_id] <= 0:
+        del _jobs_per_user[user_id]
+
+
+def start_ai_job(user_id: str, job: Coroutine) -> asyncio.Task:
+    """Run a job in a slot reserved with reserve_ai_job; the slot is released when it finishes"""
+    task = asyncio.create_task(job)
+    _ai_jobs.add(task)
+    task.add_done_callback(_ai_jobs.discard)
+    task.add_done_callback(lambda _: release_ai_job(user_id))
+    return task
+
+
+async def cancel_ai_jobs() -> None:
+    """Cancel the jobs still running (on shutdown) and wait until each has recorded its state"""
+    jobs = list(_ai_jobs)
+    for task in jobs:
+        task.cancel()
+    if jobs:
+        await asyncio.gather(*jobs, return_exceptions=True)
+        logger.info("[Lifespan] Cancelled %d running AI jobs.", len(jobs))
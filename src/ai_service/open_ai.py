@@ -1,16 +1,16 @@
 import asyncio
-import aiofiles
 import os
 import base64
-import json
-from concurrent.futures import ThreadPoolExecutor
+import orjson
 from typing import Optional, Dict, Any
 from openai import AsyncOpenAI, OpenAIError
 import logging
 
 from src.core.conf import OPENAI_API_KEY
-from src.ai_service.ai_helper import get_file_type, extract_text_from_excel, extract_text_from_pdf
-from src.ai_service.prompt import create_prompt, AI_PROMPT_EXCEL_COLUMN_MAPPING
+from src.ai_service.ai_helper import get_file_type, extract_text_from_excel, extract_text_from_pdf, \
+    prepare_image_for_model, run_in_io_pool
+from src.ai_service.prompt import create_prompt, excel_column_mapping_prompt, STATIC_PROMPT_PREFIXES
+from src.ai_service.response_cache import response_cache_key, cached_response
 
 
 logger = logging.getLogger("DocVision")
@@ -18,14 +18,17 @@ logger = logging.getLogger("DocVision")
 # Initialize async client
 async_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
 
-# Thread pool for CPU-intensive operations
-thread_pool = ThreadPoolExecutor(max_workers=4)
+OPENAI_MODEL = "gpt-4o-mini"
+OPENAI_IMAGE_MAX_SIDE = 2048
 
 
 async def convert_file_to_json_async(file_path: str, user_request: Optional[str] = None) -> Dict[str, Any]:
     """
     Async version: Convert an image, PDF, or Excel file into JSON format.
 
+    Responses are cached by file content and prompt, so re-processing the same
+    file skips the model round-trip.
+
     Args:
         file_path (str): Path to the file (image, PDF, or Excel).
         user_request (str): Additional user request to customize prompt.
@@ -38,14 +41,32 @@ async def convert_file_to_json_async(file_path: str, user_request: Optional[str]
             logging.warning(f"File not found: {file_path}")
             return {"ok": False, "message": f"File not found: {file_path}", "data": None}
 
-        # Get file type (run in thread pool if it's CPU intensive)
-        loop = asyncio.get_event_loop()
-        file_type, mime_type = await loop.run_in_executor(
-            thread_pool,
-            get_file_type,
-            file_path
+        file_type, mime_type = get_file_type(file_path)
+        if file_type == 'unknown':
+            logger.warning(f"Unsupported file type: {file_type}")
+            return {"ok": False, "message": f"Unsupported file type: {file_type}", "data": None}
+
+        # The static prefix and user request fully determine the prompt for a given file
+        prompt_fingerprint = f"{OPENAI_MODEL}\0{STATIC_PROMPT_PREFIXES[file_type]}\0{user_request}"
+        cache_key = await response_cache_key(file_path, prompt_fingerprint)
+        return await cached_response(
+            cache_key,
+            lambda: _convert_file_to_json(file_path, file_type, mime_type, user_request)
         )
 
+    except Exception as e:
+        logger.error(f"Error: {e}")
+        return {"ok": False, "message": f"Error: {e}", "data": None}
+
+
+async def _convert_file_to_json(
+    file_path: str,
+    file_type: str,
+    mime_type: Optional[str],
+    user_request: Optional[str]
+) -> Dict[str, Any]:
+    """Run extraction and the OpenAI request for a file (uncached)."""
+    try:
         logging.info(f"Processing file: {file_path}, Type: {file_type}")
 
         if file_type == 'image':
@@ -68,7 +89,7 @@ async def convert_file_to_json_async(file_path: str, user_request: Optional[str]
 
         # Send async request to OpenAI
         response = await async_client.chat.completions.create(
-            model="gpt-4o-mini",
+            model=OPENAI_MODEL,
             messages=[
                 {
                     "role": "system",
@@ -88,13 +109,7 @@ async def convert_file_to_json_async(file_path: str, user_request: Optional[str]
             logger.warning("This file/image doesn't have product data")
             return {"ok": False, "message": "This file/image doesn't have product data", "data": None}
 
-        # Parse JSON in thread pool (if it's large and CPU intensive)
-        loop = asyncio.get_event_loop()
-        dict_data = await loop.run_in_executor(
-            thread_pool,
-            json.loads,
-            result_str
-        )
+        dict_data = orjson.loads(result_str)
 
         return {"ok": True, "message": "success", "data": dict_data}
 
@@ -105,25 +120,20 @@ async def convert_file_to_json_async(file_path: str, user_request: Optional[str]
 
 async def async_file_exists(file_path: str) -> bool:
     """Check if file exists asynchronously."""
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(thread_pool, os.path.exists, file_path)
+    return await asyncio.to_thread(os.path.exists, file_path)
+
+
+def _read_image_base64(file_path: str) -> str:
+    """Downscale an image to the model's input resolution and return it as base64 JPEG."""
+    return base64.b64encode(prepare_image_for_model(file_path, OPENAI_IMAGE_MAX_SIDE)).decode('ascii')
 
 
 async def process_image_async(file_path: str, mime_type: str, user_request: Optional[str]) -> list:
     """Process image file asynchronously."""
-    # Create prompt in thread pool
-    loop = asyncio.get_event_loop()
-    image_prompt = await loop.run_in_executor(
-        thread_pool,
-        create_prompt,
-        'image',
-        user_request
-    )
-
-    # Read file asynchronously
-    async with aiofiles.open(file_path, "rb") as f:
-        image_data = await f.read()
-        encoded_image = base64.b64encode(image_data).decode('utf-8')
+    image_prompt = create_prompt('image', user_request=user_request)
+
+    # Resize and encode in one worker thread so neither step blocks the event loop
+    encoded_image = await run_in_io_pool(_read_image_base64, file_path)
 
     return [
         {
@@ -133,7 +143,7 @@ async def process_image_async(file_path: str, mime_type: str, user_request: Opti
         {
             "type": "image_url",
             "image_url": {
-                "url": f"data:{mime_type};base64,{encoded_image}"
+                "url": f"data:image/jpeg;base64,{encoded_image}"
             }
         }
     ]
@@ -142,24 +152,12 @@ async def process_image_async(file_path: str, mime_type: str, user_request: Opti
 async def process_pdf_async(file_path: str, user_request: Optional[str]) -> Optional[list]:
     """Process PDF file asynchronously."""
     # Extract text in thread pool (CPU intensive)
-    loop = asyncio.get_event_loop()
-    extracted_text = await loop.run_in_executor(
-        thread_pool,
-        extract_text_from_pdf,
-        file_path
-    )
+    extracted_text = await run_in_io_pool(extract_text_from_pdf, file_path, max_chars=15000)
 
     if not extracted_text:
         return None
 
-    # Create prompt in thread pool
-    pdf_prompt = await loop.run_in_executor(
-        thread_pool,
-        create_prompt,
-        'pdf',
-        str({extracted_text[:15000]}),
-        user_request
-    )
+    pdf_prompt = create_prompt('pdf', str({extracted_text}), user_request)
 
     return [
         {
@@ -172,24 +170,12 @@ async def process_pdf_async(file_path: str, user_request: Optional[str]) -> Opti
 async def process_excel_async(file_path: str, user_request: Optional[str]) -> Optional[list]:
     """Process Excel file asynchronously."""
     # Extract text in thread pool (CPU intensive)
-    loop = asyncio.get_event_loop()
-    extracted_text = await loop.run_in_executor(
-        thread_pool,
-        extract_text_from_excel,
-        file_path
-    )
+    extracted_text = await run_in_io_pool(extract_text_from_excel, file_path)
 
     if not extracted_text:
         return None
 
-    # Create prompt in thread pool
-    excel_prompt = await loop.run_in_executor(
-        thread_pool,
-        create_prompt,
-        'excel',
-        extracted_text,
-        user_request
-    )
+    excel_prompt = create_prompt('excel', extracted_text, user_request)
 
     return [
         {
@@ -206,22 +192,23 @@ async def process_file_background(file_path: str, user_request: Optional[str]):
 
     # Cleanup
     if await async_file_exists(file_path):
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(thread_pool, os.remove, file_path)
+        await asyncio.to_thread(os.remove, file_path)
 
 
-async def detect_excel_columns(excel_text: str, prompt: str = AI_PROMPT_EXCEL_COLUMN_MAPPING, model: str = "gpt-4o-mini") -> dict:
+async def detect_excel_columns(excel_text: str, prompt: Optional[str] = None, model: str = "gpt-4o-mini") -> dict:
     """
     Uses OpenAI model to detect and map Excel columns from given text data.
 
     Args:
-        prompt (str): Instruction text (AI_PROMPT_EXCEL_COLUMN_MAPPING).
+        prompt (str): Instruction text (default: excel_column_mapping_prompt()).
         excel_text (str): Top rows of Excel formatted as plain text.
         model (str): OpenAI model name (default: gpt-4o-mini).
 
     Returns:
         dict: Parsed JSON result with columns, irrelevant_columns, irrelevant_rows.
     """
+    if prompt is None:
+        prompt = excel_column_mapping_prompt()
 
     # Combine instruction and Excel data
     user_prompt = f"{prompt}\n\nHere are the top rows from the Excel file:\n\n{excel_text}"
@@ -241,10 +228,10 @@ async def detect_excel_columns(excel_text: str, prompt: str = AI_PROMPT_EXCEL_CO
         result_text = response.choices[0].message.content.strip()
 
         try:
-            result = json.loads(result_text)
+            result = orjson.loads(result_text)
             return {"ok": True, "result": result}
 
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             logger.warning("⚠️ Warning: Model returned invalid JSON, returning raw text.")
             return {"ok": False, "error": result_text}
 
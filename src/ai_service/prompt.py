@@ -1,3 +1,9 @@
+import sys
+from functools import cache
+from pathlib import Path
+
+_PROMPTS_DIR = Path(__file__).parent / "prompts"
+
 prompt_header_image = "Extract structured product-level JSON data from this receipt or table text."
 prompt_header_pdf = "Extract structured product-level JSON data from this extracted text from pdf."
 prompt_header_excel = "Extract structured product-level JSON data from this extracted text from excel."
@@ -180,6 +186,34 @@ excel_json_example = """
 ]
 """
 
+# Invariant parts of create_prompt, built once at import.
+# Contract: every prompt is STATIC_PROMPT_PREFIXES[type] followed only by the
+# per-request data and user request, so the leading block is byte-identical
+# across calls and OpenAI/Gemini prefix caching can reuse it. Keep anything
+# that varies per call (dates, ids, user input) out of these constants.
+_EXCEL_PROMPT_PREFIX = f"""{prompt_header_excel}{prompt_common_rules}
+Example with Russian invoice document (Extracted data from Excel may contain non-table text. Please ignore it.):{excel_example}
+JSON Output:{excel_json_example}
+Here's the extracted text from the Excel document:
+"""
+_PDF_PROMPT_PREFIX = f"""{prompt_header_pdf}{prompt_common_rules}
+Example with Russian invoice document (The data was extracted from a PDF, which makes it hard to see which value belongs to which column.):{pdf_example}
+JSON Output:{pdf_json_example}
+Here's the extracted text from the PDF:
+"""
+_IMAGE_PROMPT = f"""{prompt_header_image}{prompt_common_rules}
+Example with Russian receipt:{image_example}
+JSON Output:{image_json_example}
+"""
+# Interned so every import and cache key shares one object per template
+_EXCEL_PROMPT_PREFIX = sys.intern(_EXCEL_PROMPT_PREFIX)
+_PDF_PROMPT_PREFIX = sys.intern(_PDF_PROMPT_PREFIX)
+_IMAGE_PROMPT = sys.intern(_IMAGE_PROMPT)
+
+STATIC_PROMPT_PREFIXES = {"excel": _EXCEL_PROMPT_PREFIX, "pdf": _PDF_PROMPT_PREFIX, "image": _IMAGE_PROMPT}
+_DATA_PROMPT_PREFIXES = {"excel": _EXCEL_PROMPT_PREFIX, "pdf": _PDF_PROMPT_PREFIX}
+_USER_REQUEST_HEADER = "Additional request:\n"
+
 def create_prompt(prompt_type: str, extracted_data: str | None = None, user_request: str | None = None) -> str:
     """
     Build a formatted prompt for an LLM based on the input file type and user instructions.
@@ -202,104 +236,21 @@ def create_prompt(prompt_type: str, extracted_data: str | None = None, user_requ
         # >>> create_prompt("pdf", extracted_data="Invoice data ...", user_request="Add a price field to the JSON, set to 20% more than cost")
         "Prompt with PDF rules, examples, and extracted text, followed by 'Additional request: Add a price field to the JSON, set to 20% more than cost'"
     """
-    if prompt_type == "excel":
-        final_prompt = f"""{prompt_header_excel}{prompt_common_rules}
-Example with Russian invoice document (Extracted data from Excel may contain non-table text. Please ignore it.):{excel_example}
-JSON Output:{excel_json_example}
-Here's the extracted text from the Excel document:
-{extracted_data}
-"""
-    elif prompt_type == "pdf":
-        final_prompt = f"""{prompt_header_pdf}{prompt_common_rules}
-Example with Russian invoice document (The data was extracted from a PDF, which makes it hard to see which value belongs to which column.):{pdf_example}
-JSON Output:{pdf_json_example}
-Here's the extracted text from the PDF:
-{extracted_data}
-"""
-    else:
-        final_prompt = f"""{prompt_header_image}{prompt_common_rules}
-Example with Russian receipt:{image_example}
-JSON Output:{image_json_example}
-"""
-
-    if user_request is not None:
-        final_prompt += f"""Additional request:
-{user_request}"""
+    prefix = _DATA_PROMPT_PREFIXES.get(prompt_type)
+    if prefix is None:
+        if user_request is None:
+            return _IMAGE_PROMPT
+        return f"{_IMAGE_PROMPT}{_USER_REQUEST_HEADER}{user_request}"
 
-    return final_prompt
+    if user_request is None:
+        return f"{prefix}{extracted_data}\n"
+    return f"{prefix}{extracted_data}\n{_USER_REQUEST_HEADER}{user_request}"
 
-AI_PROMPT_EXCEL_COLUMN_MAPPING = """
-You are an AI model that extracts structured, table-like data from Excel files.
-We send you only the top rows of the Excel sheet to detect and assign column names from the provided list below.
-Column names in the Excel file usually appear in Russian or English.
+@cache
+def excel_column_mapping_prompt() -> str:
+    """Column-mapping instructions, read from prompts/ on first use and kept in memory"""
+    return (_PROMPTS_DIR / "excel_column_mapping.txt").read_text(encoding="utf-8")
 
-Important detection rules:
-- Always map "Номенклатура" (and any similar column like "Товар", "Наименование", "Product", "Item") to the key "name".
-- The "name" column is the main column that represents the product title and is mandatory if it exists.
-- Never skip or mark "Номенклатура" as irrelevant — it should always be included in "columns" with the key "name".
-- If both "Код" and "Номенклатура" exist, "Код" is usually an internal ID, while "Номенклатура" is the actual product name.
-- Always try to detect and map "Группа", "Группа товаров", "Категория", "Group", or "Category" columns to the key "group_path".
-    This column represents the full category path of the product (e.g., “Еда/Фрукты/Бананы”).
-    If found, it should be included in "columns" with the key "group_path", not marked as irrelevant.
-
-  {
-    "name": 3,
-    "articul": 4,
-    "unit_name": 5,
-    "quantity": 6,
-    "cost": 7
-  }
-- If a row contains column headers (for example, “Наименование”, “Артикул”, “Ед. изм.”, “Кол-во”, etc.), treat it as a header row and include its index in the irrelevant_rows list, since headers are not actual data rows.
-
-Your task:
-Return only JSON data containing:
-- "columns": assigned column names with their column indexes,
-- "irrelevant_columns": list of column indexes that are not in provided list below,
-- "irrelevant_rows": list of row indexes that don't have enough content.
-
-Column names to choose from:
-name — Short product name or title. (Наименование, Номенклатура, Товар, Продукт)
-code - Product's code in database (Код, Код номенклатуры)
-fullname — Full or extended product name with details. (Полное наименование)
-articul — Article number or internal product code. (Артикул, Код номенклатуры)
-group_path — Full group/category path (e.g., 'Food/Beverages'). (Группа (структура/путь))
-barcodes — One or more barcodes of the product. (Штрихкод, Штрихкоды)
-color_name — Product color. (Цвет)
-brand_name — Brand or trademark. (Бренд)
-producer_name — Manufacturer or producer name. (Производитель)
-size_name — Product size or dimension (e.g., '500ml', 'L'). (Размер)
-unit_name — Unit of measurement (e.g., 'pcs', 'kg'). (Единица измерения)
-department_name — Department or product section. (Отдел)
-description — Product description or ingredients. (Описание)
-vat_name — VAT (Value Added Tax) rate applied. (Ставка НДС)
-icps — Product classification code. (ИКПУ)
-labeled — Indicates if the product requires mandatory labeling. (Метка обязательной маркировки)
-package_code — Packaging code (type or batch). (Код упаковки)
-parent_code — Parent product code for variations. (Код родителя (для создания вариации))
-quantity — Quantity of the product (number of units). (Кол-во, Количество)
-cost — Purchase or cost price. (Себестоимость, Закупочная цена, Стоимость)
-price — Selling price of the product. (Цена)
-
-Output format (JSON only):
-{
-  "columns": {
-    "name": 1,
-    "barcodes": 2,
-    "quantity": 4,
-    "cost": 9
-  },
-  "irrelevant_columns": [3, 5, 7, 8],
-  "irrelevant_rows": [1, 2, 3, 4, 5, 6, 7]
-}
-
-Notes for the AI:
-- You missed name
-- Ignore decorative headers, totals, or empty rows.
-- Focus on identifying the most relevant columns that describe product data.
-- If no relevant columns are found, return exactly ###false### as a string.
-- Return only JSON — no extra text, comments, or code fences.
-- To help you understand the table structure more accurately, each Excel row is wrapped between <ROW_START> and <ROW_END> tags, and every cell inside a row is enclosed in <CELL> and </CELL> tags. This ensures you can clearly detect where each row and cell begins and ends, even if some cell values contain spaces, commas, or line breaks.
-"""
 
 AI_PROMPT_PDF_COLUMN_MAPPING = """
 You are an AI model that extracts structured, table-like data from PDF files.
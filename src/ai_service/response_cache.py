@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+import orjson
+from cachetools import TTLCache
+
+from src.core.redis_client import redis_client
+
+logger = logging.getLogger("DocVision")
+
+# Bump to drop every cached model response at once (e.g. after a parser change)
+RESPONSE_CACHE_VERSION = "v1"
+RESPONSE_CACHE_TTL = 3600
+# Redis outlives the process and is shared by every worker, so it keeps entries longer
+REDIS_RESPONSE_CACHE_PREFIX = "ai_response"
+REDIS_RESPONSE_CACHE_TTL = 86400
+
+_response_cache: TTLCache = TTLCache(maxsize=1024, ttl=RESPONSE_CACHE_TTL)
+_inflight: dict[str, asyncio.Task] = {}
+
+
+def file_sha256(file_path: str) -> str:
+    """Hash a file without loading it whole (OpenSSL SHA-256, releases the GIL)"""
+    with open(file_path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+async def response_cache_key(file_path: str, prompt: str, file_hash: Optional[str] = None) -> str:
+    """
+    Build a cache key from the file content and the prompt used to process it.
+
+    Hashing the prompt means a prompt edit never serves responses produced by
+    the old wording. Pass file_hash when the content was already hashed (e.g.
+    while the upload was read) to skip reading the file back from disk.
+    """
+    if file_hash is None:
+        file_hash = await asyncio.to_thread(file_sha256, file_path)
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return f"{RESPONSE_CACHE_VERSION}:{file_hash}:{prompt_hash}"
+
+
+def text_cache_key(text: str, prompt: str) -> str:
+    """
+    Build a cache key for text input (e.g. spreadsheet top rows).
+
+    Trailing whitespace and blank lines are dropped first, so the same template
+    exported with different padding shares one entry. Whitespace inside a line
+    is kept: in tab-separated rows it marks empty cells and column positions.
+    """
+    normalized = "\n".join(line.rstrip() for line in text.splitlines() if line.strip())
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(prompt.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalized.encode("utf-8"))
+    return f"{RESPONSE_CACHE_VERSION}:text:{digest.hexdigest()}"
+
+
+async def _redis_get(key: str) -> Optional[dict]:
+    try:
+        cached = await redis_client.get(f"{REDIS_RESPONSE_CACHE_PREFIX}:{key}")
+        return orjson.loads(cached) if cached is not None else None
+    except Exception as e:
+        logger.warning(f"AI response cache read failed: {e}")
+        return None
+
+
+async def _redis_set(key: str, result: dict) -> None:
+    try:
+        await redis_client.set(
+            f"{REDIS_RESPONSE_CACHE_PREFIX}:{key}",
+            orjson.dumps(result, option=orjson.OPT_NON_STR_KEYS),
+            ex=REDIS_RESPONSE_CACHE_TTL,
+        )
+    except Exception as e:
+        logger.warning(f"AI response cache write failed: {e}")
+
+
+async def _compute_through_redis(key: str, compute: Callable[[], Awaitable[dict]]) -> Any:
+    """Check the shared Redis tier before computing, and publish successful results to it"""
+    cached = await _redis_get(key)
+    if cached is not None:
+        logger.info(f"AI response Redis cache hit: {key}")
+        return cached
+
+    result = await compute()
+    if isinstance(result, dict) and result.get("ok"):
+        await _redis_set(key, result)
+    return result
+
+
+def _store_result(key: str, task: asyncio.Task) -> None:
+    _inflight.pop(key, None)
+    if task.cancelled() or task.exception() is not None:
+        return
+
+    result = task.result()
+    if isinstance(result, dict) and result.get("ok"):
+        _response_cache[key] = result
+
+
+async def cached_response(
+    key: str,
+    compute: Callable[[], Awaitable[dict]],
+    scope: Optional[str] = None
+) -> Any:
+    """
+    Return the cached response for key, or compute and cache it.
+
+    Lookups go to the in-process cache first, then to Redis (shared across
+    workers and restarts). Concurrent calls with the same key share a single
+    model request. Only successful responses ({"ok": True, ...}) are cached.
+    Redis errors are logged and treated as misses.
+
+    Args:
+        key: Cache key from response_cache_key / text_cache_key.
+        compute: Coroutine factory producing the uncached response.
+        scope: Optional owner (e.g. user id); entries are only shared within it.
+    """
+    if scope is not None:
+        key = f"{scope}:{key}"
+
+    cached = _response_cache.get(key)
+    if cached is not None:
+        logger.info(f"AI response cache hit: {key}")
+        return cached
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_compute_through_redis(key, compute))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _store_result(key, t))
+
+    # Shield so one cancelled caller does not cancel the request others wait on
+    return await asyncio.shield(task)
@@ -1,18 +1,24 @@
 import asyncio
+import hashlib
 import io
-import json
-from datetime import datetime
+import itertools
+import os
+import time
+import uuid
 from pathlib import Path
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Awaitable, Callable, Optional
 
+import orjson
 from PIL import Image
 from fastapi.responses import StreamingResponse
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request, status
 import logging
 
 from src.ai_service.gemini_ai import extract_data, detect_excel_columns_gemini, ai_match_products
+from src.ai_service.jobs import reserve_ai_job, release_ai_job, start_ai_job
 from src.billing.subscription_service import SubscriptionService
-from src.core.conf import ALLOWED_EXTENSIONS, MAX_FILE_SIZE
+from src.core.conf import ALLOWED_EXTENSIONS, MAX_FILE_SIZE, MAX_UPLOAD_SIZE
+from src.core.redis_client import redis_client
 from src.core.security import get_current_user
 from src.models.ai import DetectColumnName, AIMatchRequest
 from src.models.user import User
@@ -21,117 +27,307 @@ from src.utils.helper import compress_file
 logger = logging.getLogger("DocVision")
 router = APIRouter(prefix="/ai", tags=["AI"])
 
+UPLOAD_DIR = Path("uploads")
+UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MPO_MAX_SIDE = 2048
+KEEPALIVE_INTERVAL = 5.0
+# Finished job results stay readable this long; the client polls GET /ai/job/{job_id}
+AI_JOB_TTL = 3600
+
+_upload_seq = itertools.count()
+
+
+def _sse(payload: dict) -> bytes:
+    """Serialize one server-sent event frame"""
+    return b"data: " + orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) + b"\n\n"
+
+
+# Fixed frames are serialized once at import; only errors and results are built per request
+SSE_VALIDATING = _sse({'status': 'validating', 'message': 'Checking file type...'})
+SSE_EXTENSION_NOT_ALLOWED = _sse({'status': 'error', 'message': f"File type not allowed. Allowed: {', '.join(sorted(ALLOWED_EXTENSIONS))}"})
+SSE_CHECKING_SIZE = _sse({'status': 'checking_size', 'message': 'Checking file size...'})
+SSE_COMPRESSING = _sse({'status': 'compressing', 'message': 'File too large, compressing...'})
+SSE_SAVING = _sse({'status': 'saving', 'message': 'Saving file...'})
+SSE_CHECKING_SUBSCRIPTION = _sse({'status': 'checking_subscription', 'message': 'Checking AI usage...'})
+SSE_EXTRACTING = _sse({'status': 'extracting', 'message': 'Extracting data with AI...'})
+SSE_PROCESSING = _sse({'status': 'processing', 'message': 'AI is analyzing your document...'})
+SSE_FINALIZING = _sse({'status': 'finalizing', 'message': 'Finalizing results...'})
+SSE_DETECTING_COLUMNS = _sse({'status': 'detecting', 'message': 'Analyzing columns with AI...'})
+SSE_DETECTING_MATCHES = _sse({'status': 'detecting', 'message': 'Analyzing unmatched products with AI...'})
+SSE_KEEPALIVE_DOCUMENTS = _sse({'status': 'keepalive', 'message': 'ИИ обрабатывает документы...'})
+SSE_KEEPALIVE_MATCHING = _sse({'status': 'keepalive', 'message': 'ИИ обрабатывает сопоставление продуктов...'})
+
+
+def _save_upload(file_path: str, content: bytes) -> None:
+    """Write an upload with one unbuffered write, recreating the directory only if it vanished"""
+    try:
+        fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    except FileNotFoundError:
+        UPLOAD_DIR.mkdir(exist_ok=True)
+        fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(content)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+def _upload_extension(filename: Optional[str]) -> str:
+    filename = filename or ""
+    dot = filename.rfind(".")
+    return filename[dot:].lower() if dot >= 0 else ""
+
+
+async def _read_upload(file: UploadFile) -> tuple[bytes, str, Optional[str]]:
+    """
+    Read an upload in chunks, enforcing MAX_UPLOAD_SIZE (HTTP 413).
+
+    Returns (content, extension, content hash). Disallowed types are not read at
+    all: content is empty and the hash is None, and the caller reports the error.
+    """
+    file_extension = _upload_extension(file.filename)
+    if file_extension not in ALLOWED_EXTENSIONS:
+        return b"", file_extension, None
+
+    # Starlette records the spooled size while parsing the form; reject before reading
+    # anything. The chunked read below still enforces the limit when size is unknown.
+    if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large (>{MAX_UPLOAD_SIZE} bytes)"
+        )
+    buffer = io.BytesIO()
+    # Hash while the chunk is still hot in cache instead of re-reading the saved file.
+    # The extension is hashed too: it decides normalization and the model pipeline.
+    hasher = hashlib.sha256(file_extension.encode())
+    size = 0
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > MAX_UPLOAD_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File too large (>{MAX_UPLOAD_SIZE} bytes)"
+            )
+        hasher.update(chunk)
+        buffer.write(chunk)
+    return buffer.getvalue(), file_extension, hasher.hexdigest()
+
 
 def normalize_mpo_to_jpeg(file_content: bytes) -> bytes:
+    """Re-encode the first frame of an MPO (multi-picture JPEG) as a plain JPEG"""
     img = Image.open(io.BytesIO(file_content))
     img.seek(0)  # first frame
+    # Let libjpeg decode at a reduced scale; the models never need more than this
+    img.draft("RGB", (MPO_MAX_SIDE, MPO_MAX_SIDE))
     output = io.BytesIO()
-    img.save(output, format="JPEG")
+    img.save(output, format="JPEG", quality=85, subsampling=2, optimize=False, progressive=False)
     return output.getvalue()
 
 
-async def invoice_upload_stream(
+async def _refund_usage(usage_task: asyncio.Task, user_id: str) -> None:
+    """The upload could not be saved, so the model never runs: return the credit if it was taken"""
+    usage_result = await usage_task
+    if usage_result.get("ok"):
+        await SubscriptionService.refund_ai_usage_operation(user_id=user_id)
+
+
+async def _keepalive_until_done(
+        task: asyncio.Task,
+        keepalive: bytes,
+        request: Request
+) -> AsyncGenerator[bytes, None]:
+    """
+    Yield a keepalive frame now and every KEEPALIVE_INTERVAL seconds until the task finishes.
+
+    If the client has gone away the task is cancelled and iteration stops early; the
+    task may not have finished cancelling yet, so callers check task.done() first.
+    """
+    while not task.done():
+        if await request.is_disconnected():
+            logger.info("Client disconnected, cancelling AI task")
+            task.cancel()
+            return
+        yield keepalive
+        # Wakes as soon as the task finishes; never cancels it and never raises its error
+        await asyncio.wait((task,), timeout=KEEPALIVE_INTERVAL)
+
+
+async def process_invoice(
         file_content: bytes,
         file_extension: str,
-        current_user: User
-) -> AsyncGenerator[str, None]:
-    """Stream processing updates for invoice upload"""
-
+        user_id: str,
+        progress: Callable[[str], Awaitable[None]],
+        content_hash: Optional[str] = None
+) -> dict:
+    """
+    Invoice pipeline shared by the SSE upload and the queued job: normalize, compress,
+    save, charge one AI credit and extract. Each stage is reported as progress(stage).
+
+    Returns the extraction result, or {"ok": False, "message": ...} (with "error_code"
+    for usage failures) when the upload is rejected.
+    """
+    await progress("checking_size")
+    if file_extension == ".mpo":
+        file_content = await asyncio.to_thread(normalize_mpo_to_jpeg, file_content)
+        file_extension = ".jpg"
+
+    if len(file_content) > MAX_FILE_SIZE:
+        await progress("compressing")
+        file_content = await compress_file(file_content, file_extension)
+        if len(file_content) > MAX_FILE_SIZE:
+            return {"ok": False, "message": f"File too large even after compression (>{MAX_FILE_SIZE} bytes)"}
+
+    await progress("saving")
+    # Nanosecond clock plus a per-process counter: unique even for uploads in the same second
+    file_path = f"{UPLOAD_DIR}/upload_{time.time_ns():x}_{next(_upload_seq):x}{file_extension}"
+
+    # The usage check is a DB round-trip independent of the disk write, so run
+    # them together. The model call itself still waits for the usage result:
+    # a cancelled task cannot stop a blocking SDK call that is already billed.
+    usage_task = asyncio.create_task(SubscriptionService.save_ai_usage_operation(user_id=user_id))
+
+    # Write off the event loop so other requests keep flowing during disk I/O
     try:
-        # Step 1: Validate file extension
-        yield f"data: {json.dumps({'status': 'validating', 'message': 'Checking file type...'})}\n\n"
+        await asyncio.to_thread(_save_upload, file_path, file_content)
+    except BaseException:
+        # Cancellation included: either way the model never runs for this upload
+        await _refund_usage(usage_task, user_id)
+        raise
+
+    await progress("checking_subscription")
+    usage_result = await usage_task
+    if not usage_result.get("ok"):
+        return {
+            "ok": False,
+            "message": usage_result.get("message", "Failed to check AI usage"),
+            "error_code": usage_result.get("code", 500)
+        }
 
-        if file_extension not in ALLOWED_EXTENSIONS:
-            yield f"data: {json.dumps({'status': 'error', 'message': f'File type not allowed. Allowed: {ALLOWED_EXTENSIONS}'})}\n\n"
+    await progress("extracting")
+    await progress("processing")
+    return await extract_data(file_path=file_path, content_hash=content_hash, user_id=user_id)
+
+
+# process_invoice stages as the fixed SSE frames the upload stream sends for them
+_SSE_STAGE_FRAMES = {
+    "checking_size": SSE_CHECKING_SIZE,
+    "compressing": SSE_COMPRESSING,
+    "saving": SSE_SAVING,
+    "checking_subscription": SSE_CHECKING_SUBSCRIPTION,
+    "extracting": SSE_EXTRACTING,
+    "processing": SSE_PROCESSING,
+}
+
+
+async def _frames_until_done(
+        task: asyncio.Task,
+        frames: asyncio.Queue,
+        keepalive: bytes,
+        request: Request
+) -> AsyncGenerator[bytes, None]:
+    """
+    Yield frames from the queue as the task produces them, and a keepalive frame after
+    KEEPALIVE_INTERVAL seconds without one, until the task finishes.
+
+    If the client has gone away the task is cancelled and iteration stops early, like
+    _keepalive_until_done.
+    """
+    while True:
+        while not frames.empty():
+            yield frames.get_nowait()
+        if task.done():
+            return
+        if await request.is_disconnected():
+            logger.info("Client disconnected, cancelling AI task")
+            task.cancel()
             return
 
-        # Step 2: Check size (15%)
-        yield f"data: {json.dumps({'status': 'checking_size', 'message': 'Checking file size...'})}\n\n"
-        if file_extension == ".mpo":
-            file_content = normalize_mpo_to_jpeg(file_content)
-            file_extension = ".jpg"
-
-        file_size = len(file_content)
-        # Step 3: Compress if needed (25%)
-        if file_size > MAX_FILE_SIZE:
-            yield f"data: {json.dumps({'status': 'compressing', 'message': 'File too large, compressing...'})}\n\n"
-
-            file_content = await compress_file(file_content, file_extension)
-            compressed_size = len(file_content)
-
-            if compressed_size > MAX_FILE_SIZE:
-                yield f"data: {json.dumps({'status': 'error', 'message': f'File too large even after compression (>{MAX_FILE_SIZE} bytes)'})}\n\n"
-                return
-
-        # Step 4: Save file (35%)
-        yield f"data: {json.dumps({'status': 'saving', 'message': 'Saving file...'})}\n\n"
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        custom_filename = f"upload_{timestamp}{file_extension}"
-        file_path = f"uploads/{custom_filename}"
-        Path("uploads").mkdir(exist_ok=True)
-
-        with open(file_path, "wb") as buffer:
-            buffer.write(file_content)
+        getter = asyncio.ensure_future(frames.get())
+        try:
+            done, _ = await asyncio.wait((getter, task), timeout=KEEPALIVE_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if not getter.done():
+                getter.cancel()
+        if getter in done:
+            yield getter.result()
+        elif not done:
+            yield keepalive
 
-        # Step 5: Check subscription (45%)
-        yield f"data: {json.dumps({'status': 'checking_subscription', 'message': 'Checking AI usage...'})}\n\n"
 
-        user_id = current_user.id
-        usage_result = await SubscriptionService.save_ai_usage_operation(user_id=user_id)
-        # Check if the operation failed
-        if not usage_result.get("ok"):
-            error_message = usage_result.get("message", "Failed to check AI usage")
-            error_code = usage_result.get("code", 500)
-            yield f"data: {json.dumps({'status': 'error', 'message': error_message, "error_code": error_code})}\n\n"
-            return  # Break SSE stream - STOPS HERE
+async def invoice_upload_stream(
+        file_content: bytes,
+        file_extension: str,
+        current_user: User,
+        request: Request,
+        content_hash: Optional[str] = None
+) -> AsyncGenerator[bytes, None]:
+    """Stream processing updates for invoice upload"""
 
-        # Step 6: Extract data - START (55%)
-        yield f"data: {json.dumps({'status': 'extracting', 'message': 'Extracting data with AI...'})}\n\n"
+    task = None
+    try:
+        # Step 1: Validate file extension
+        yield SSE_VALIDATING
 
-        # Step 7: Extract data - IN PROGRESS (70%)
-        yield f"data: {json.dumps({'status': 'processing', 'message': 'AI is analyzing your document...'})}\n\n"
+        if file_extension not in ALLOWED_EXTENSIONS:
+            yield SSE_EXTENSION_NOT_ALLOWED
+            return
 
-        task = asyncio.create_task(extract_data(file_path=file_path))
+        # Steps 2-7 run in process_invoice; its stages arrive here as frames
+        frames: asyncio.Queue = asyncio.Queue()
 
-        while not task.done():
-            yield f"data: {json.dumps({'status': 'keepalive', 'message': 'ИИ обрабатывает документы...'})}\n\n"
+        async def progress(stage: str) -> None:
+            frames.put_nowait(_SSE_STAGE_FRAMES[stage])
 
-            # Wait up to 5 seconds for task to complete
-            done, pending = await asyncio.wait([task], timeout=5.0)
+        task = asyncio.create_task(
+            process_invoice(file_content, file_extension, current_user.id, progress, content_hash)
+        )
 
-            if done:
-                break
+        async for frame in _frames_until_done(task, frames, SSE_KEEPALIVE_DOCUMENTS, request):
+            yield frame
 
-        result = await task
+        # Not done: the client disconnected and the task is still being cancelled
+        if not task.done() or task.cancelled():
+            return
+        result = task.result()
 
         if not result.get("ok"):
-            yield f"data: {json.dumps({'status': 'error', 'message': result.get('message', 'File conversion failed')})}\n\n"
+            error = {'status': 'error', 'message': result.get('message', 'File conversion failed')}
+            if "error_code" in result:
+                error['error_code'] = result["error_code"]
+            yield _sse(error)
             return
 
         # Step 8: Post-processing (85%)
-        yield f"data: {json.dumps({'status': 'finalizing', 'message': 'Finalizing results...'})}\n\n"
+        yield SSE_FINALIZING
 
         # Small delay to show the status
         await asyncio.sleep(0.5)
 
         # Step 9: Success (100%)
-        yield f"data: {json.dumps({'status': 'completed', 'result': result})}\n\n"
+        yield _sse({'status': 'completed', 'result': result})
 
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
-        logger.error(f"Error in invoice_upload_stream: {error_details}")
-        yield f"data: {json.dumps({'status': 'error', 'message': str(e)})}\n\n"
+        logger.error("Error in invoice_upload_stream: %s", error_details)
+        yield _sse({'status': 'error', 'message': str(e)})
+    finally:
+        # Covers client disconnects surfacing as GeneratorExit/CancelledError at a yield
+        if task is not None and not task.done():
+            task.cancel()
 
 async def detect_columns_stream(
         top_rows: str,
-        current_user: User
-) -> AsyncGenerator[str, None]:
+        current_user: User,
+        request: Request
+) -> AsyncGenerator[bytes, None]:
     """Stream processing updates for column detection"""
+    task = None
     try:
         # Step 1: Check subscription
-        yield f"data: {json.dumps({'status': 'checking_subscription', 'message': 'Checking AI usage...'})}\n\n"
+        yield SSE_CHECKING_SUBSCRIPTION
 
         user_id = current_user.id
         usage_result = await SubscriptionService.save_ai_usage_operation(user_id=user_id)
@@ -139,47 +335,50 @@ async def detect_columns_stream(
         if not usage_result.get("ok"):
             error_message = usage_result.get("message", "Failed to check AI usage")
             error_code = usage_result.get("code", 500)
-            yield f"data: {json.dumps({'status': 'error', 'message': error_message, "error_code": error_code})}\n\n"
+            yield _sse({'status': 'error', 'message': error_message, 'error_code': error_code})
             return  # Break SSE stream - STOPS HERE
 
         # Step 2: Detect columns (this is the AI operation)
-        yield f"data: {json.dumps({'status': 'detecting', 'message': 'Analyzing columns with AI...'})}\n\n"
+        yield SSE_DETECTING_COLUMNS
 
         task = asyncio.create_task(detect_excel_columns_gemini(excel_text=top_rows))
 
-        while not task.done():
-            yield f"data: {json.dumps({'status': 'keepalive', 'message': 'ИИ обрабатывает документы...'})}\n\n"
-
-            # Wait up to 5 seconds for task to complete
-            done, pending = await asyncio.wait([task], timeout=5.0)
+        async for frame in _keepalive_until_done(task, SSE_KEEPALIVE_DOCUMENTS, request):
+            yield frame
 
-            if done:
-                break
-
-        result = await task
+        # Not done: the client disconnected and the task is still being cancelled
+        if not task.done() or task.cancelled():
+            return
+        result = task.result()
 
         if not result.get("ok"):
-            yield f"data: {json.dumps({'status': 'error', 'message': result.get('error', 'Something went wrong')})}\n\n"
+            yield _sse({'status': 'error', 'message': result.get('error', 'Something went wrong')})
             return
 
         # Step 3: Success
-        yield f"data: {json.dumps({'status': 'completed', 'result': result})}\n\n"
+        yield _sse({'status': 'completed', 'result': result})
 
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
-        logger.error(f"Error in detect_columns_stream: {error_details}")
-        yield f"data: {json.dumps({'status': 'error', 'message': str(e)})}\n\n"
+        logger.error("Error in detect_columns_stream: %s", error_details)
+        yield _sse({'status': 'error', 'message': str(e)})
+    finally:
+        # Covers client disconnects surfacing as GeneratorExit/CancelledError at a yield
+        if task is not None and not task.done():
+            task.cancel()
 
 async def ai_match_products_stream(
         not_matched_items: str,
         found_result: str,
-        current_user: User
-) -> AsyncGenerator[str, None]:
+        current_user: User,
+        request: Request
+) -> AsyncGenerator[bytes, None]:
     """Stream processing updates for match products"""
+    task = None
     try:
         # Step 1: Check subscription
-        yield f"data: {json.dumps({'status': 'checking_subscription', 'message': 'Checking AI usage...'})}\n\n"
+        yield SSE_CHECKING_SUBSCRIPTION
 
         user_id = current_user.id
         usage_result = await SubscriptionService.save_ai_usage_operation(user_id=user_id)
@@ -187,49 +386,105 @@ async def ai_match_products_stream(
         if not usage_result.get("ok"):
             error_message = usage_result.get("message", "Failed to check AI usage")
             error_code = usage_result.get("code", 500)
-            yield f"data: {json.dumps({'status': 'error', 'message': error_message, "error_code": error_code})}\n\n"
+            yield _sse({'status': 'error', 'message': error_message, 'error_code': error_code})
             return  # Break SSE stream - STOPS HERE
 
         # Step 2: Detect columns (this is the AI operation)
-        yield f"data: {json.dumps({'status': 'detecting', 'message': 'Analyzing unmatched products with AI...'})}\n\n"
+        yield SSE_DETECTING_MATCHES
 
         task = asyncio.create_task(ai_match_products(not_matched_items, found_result))
 
-        while not task.done():
-            yield f"data: {json.dumps({'status': 'keepalive', 'message': 'ИИ обрабатывает сопоставление продуктов...'})}\n\n"
+        async for frame in _keepalive_until_done(task, SSE_KEEPALIVE_MATCHING, request):
+            yield frame
 
-            # Wait up to 5 seconds for task to complete
-            done, pending = await asyncio.wait([task], timeout=5.0)
-
-            if done:
-                break
-
-        result = await task
+        # Not done: the client disconnected and the task is still being cancelled
+        if not task.done() or task.cancelled():
+            return
+        result = task.result()
 
         if not result:
-            yield f"data: {json.dumps({'status': 'error', 'message': result.get('error', 'Something went wrong')})}\n\n"
+            yield _sse({'status': 'error', 'message': result.get('error', 'Something went wrong')})
             return
 
         # Step 3: Success
-        yield f"data: {json.dumps({'status': 'completed', 'result': result})}\n\n"
+        yield _sse({'status': 'completed', 'result': result})
 
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
-        logger.error(f"Error in detect_columns_stream: {error_details}")
-        yield f"data: {json.dumps({'status': 'error', 'message': str(e)})}\n\n"
+        logger.error("Error in ai_match_products_stream: %s", error_details)
+        yield _sse({'status': 'error', 'message': str(e)})
+    finally:
+        # Covers client disconnects surfacing as GeneratorExit/CancelledError at a yield
+        if task is not None and not task.done():
+            task.cancel()
+
+def _job_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+async def _set_job_state(job_id: str, **fields) -> None:
+    """Update a job's Redis hash and slide its TTL in one round trip"""
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.hset(_job_key(job_id), mapping=fields)
+        pipe.expire(_job_key(job_id), AI_JOB_TTL)
+        await pipe.execute()
+
+
+async def run_invoice_job(
+        job_id: str,
+        file_content: bytes,
+        file_extension: str,
+        user_id: str,
+        content_hash: Optional[str] = None
+) -> None:
+    """process_invoice as a background job, reporting its stage and result to Redis instead of SSE"""
+    async def progress(stage: str) -> None:
+        await _set_job_state(job_id, stage=stage)
+
+    try:
+        await _set_job_state(job_id, status="processing")
+
+        result = await process_invoice(file_content, file_extension, user_id, progress, content_hash)
+        if not result.get("ok"):
+            error = {"error": result.get("message", "File conversion failed")}
+            if "error_code" in result:
+                error["error_code"] = result["error_code"]
+            await _set_job_state(job_id, status="error", **error)
+            return
+
+        await _set_job_state(
+            job_id, status="completed",
+            result=orjson.dumps(result, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        )
+
+    except asyncio.CancelledError:
+        # Cancelled on shutdown: record a final state so pollers stop waiting
+        try:
+            await _set_job_state(job_id, status="error", error="Processing was interrupted, please upload the file again")
+        except Exception as redis_error:
+            logger.error("Could not record interruption of invoice job %s: %s", job_id, redis_error)
+        raise
+
+    except Exception as e:
+        logger.error("Error in invoice job %s: %s", job_id, e, exc_info=True)
+        try:
+            await _set_job_state(job_id, status="error", error=str(e))
+        except Exception as redis_error:
+            logger.error("Could not record failure of invoice job %s: %s", job_id, redis_error)
+
 
 @router.post("/invoice-file-upload")
 async def invoice_file_upload(
+    request: Request,
     current_user: User = Depends(get_current_user),
     file: UploadFile = File(...)
 ):
-    file_content = await file.read()
-    file_extension = Path(file.filename).suffix.lower()
+    file_content, file_extension, content_hash = await _read_upload(file)
 
     # Now pass the content to the stream generator
     return StreamingResponse(
-        invoice_upload_stream(file_content, file_extension, current_user),
+        invoice_upload_stream(file_content, file_extension, current_user, request, content_hash),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -239,8 +494,57 @@ async def invoice_file_upload(
     )
 
 
+@router.post("/invoice-file-job", status_code=status.HTTP_202_ACCEPTED)
+async def invoice_file_job(
+    current_user: User = Depends(get_current_user),
+    file: UploadFile = File(...)
+):
+    """Queue an invoice extraction and return at once; poll GET /ai/job/{job_id} for the result"""
+    file_content, file_extension, content_hash = await _read_upload(file)
+    if file_extension not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File type not allowed. Allowed: {', '.join(sorted(ALLOWED_EXTENSIONS))}"
+        )
+
+    job_id = uuid.uuid4().hex
+    # Refused with 429 if too many jobs are running; the slot is held from here so the
+    # queued state is written before the job can report progress
+    reserve_ai_job(current_user.id)
+    try:
+        await _set_job_state(job_id, status="queued", user_id=current_user.id)
+    except BaseException:
+        release_ai_job(current_user.id)
+        raise
+
+    start_ai_job(
+        current_user.id,
+        run_invoice_job(job_id, file_content, file_extension, current_user.id, content_hash)
+    )
+
+    return {"job_id": job_id, "status": "queued"}
+
+
+@router.get("/job/{job_id}")
+async def get_ai_job(job_id: str, current_user: User = Depends(get_current_user)):
+    job = await redis_client.hgetall(_job_key(job_id))
+    # Someone else's job is reported exactly like a missing one
+    if not job or job.get("user_id") != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+
+    response = {"job_id": job_id, "status": job["status"]}
+    if "result" in job:
+        response["result"] = orjson.loads(job["result"])
+    if "error" in job:
+        response["error"] = job["error"]
+    if "error_code" in job:
+        response["error_code"] = int(job["error_code"])
+    return response
+
+
 @router.post("/detect-column-names")
 async def detect_column_names(
+        request: Request,
         data: DetectColumnName,
         current_user: User = Depends(get_current_user)
 ):
@@ -250,7 +554,7 @@ async def detect_column_names(
     top_rows = data.top_rows
 
     return StreamingResponse(
-        detect_columns_stream(top_rows, current_user),
+        detect_columns_stream(top_rows, current_user, request),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -260,10 +564,20 @@ async def detect_column_names(
     )
 
 @router.post("/match")
-async def match_products_with_ai(data: AIMatchRequest, current_user: User = Depends(get_current_user)):
-    logger.info(f"data: {data}")
+async def match_products_with_ai(
+        request: Request,
+        data: AIMatchRequest,
+        current_user: User = Depends(get_current_user)
+):
+    # The payload fields can be megabytes of JSON: log sizes, and the body only at DEBUG
+    logger.info(
+        "AI match request: not_matched_items=%d chars, found_result=%d chars",
+        len(data.not_matched_items), len(data.found_result)
+    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("AI match request data: %r", data)
     return StreamingResponse(
-        ai_match_products_stream(data.not_matched_items, data.found_result, current_user),
+        ai_match_products_stream(data.not_matched_items, data.found_result, current_user, request),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -2,18 +2,21 @@ from fastapi import HTTPException, APIRouter, Depends, BackgroundTasks
 from fastapi import status
 
 from src.api.v1.routes.tokens import upsert_regos_token
-from src.auth.auth import AuthService, email_exists
+from src.auth import bcrypt_pool
+from src.auth.auth import AuthService, email_exists, DUMMY_PASSWORD_HASH
 from src.auth.session import SessionManager
 from src.auth.user import UserService
 from src.core.db import DatabaseConnection
 from src.core.regos_api import regos_async_api_request
-from src.core.security import get_current_user, get_session_id_from_token
+from src.core.security import get_current_user, get_session_id_from_token, invalidate_session_cache, \
+    invalidate_user_session_cache
+from src.billing.order_service import OrderService
 from src.billing.subscription_service import SubscriptionService
 from src.models.token import RegosAuthToken, RegosTokenCreateUpdate
 from src.models.user import TokenResponse, UserCreateRegos, UserLogin, User, ResetPassword, ChangePassword, \
     VerificationData, UserCreate
 from src.utils.helper import generate_password
-from src.verify_service.resend_verify_service import check_verification_code, send_verification_code, \
+from src.verify_service.resend_verify_service import check_verification_code, enqueue_verification_code, \
     add_code_into_db
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
@@ -40,7 +43,7 @@ async def register(user_data: UserCreate):
 
 
 @router.post("/login", response_model=TokenResponse)
-async def login(login_data: UserLogin):
+async def login(login_data: UserLogin, background_tasks: BackgroundTasks):
     """Login user"""
     user = await UserService.authenticate_user(login_data.login, login_data.password)
     if not user:
@@ -51,6 +54,8 @@ async def login(login_data: UserLogin):
 
     session = await SessionManager.create_session(user.id)
     token = AuthService.create_access_token(user.id, session.session_id)
+    # Runs after the response is sent; the billing page's order list is then served from memory
+    background_tasks.add_task(OrderService.prefetch_user_orders, user.id)
 
     return TokenResponse(
         access_token=token,
@@ -67,6 +72,7 @@ async def logout(
 ):
     """Logout user (delete current session)"""
     deleted = await SessionManager.delete_session(session_id)
+    await invalidate_session_cache(session_id)
     if deleted:
         return {"message": "Logged out successfully"}
     else:
@@ -77,6 +83,7 @@ async def logout(
 async def logout_all(current_user: User = Depends(get_current_user)):
     """Logout from all devices (delete all user sessions)"""
     deleted_count = await SessionManager.delete_user_sessions(current_user.id)
+    await invalidate_user_session_cache(current_user.id)
     return {
         "message": f"Logged out from {deleted_count} sessions",
         "deleted_sessions": deleted_count
@@ -98,10 +105,9 @@ async def change_password(data: ChangePassword, current_user: User = Depends(get
     """Reset user password after verifying the old password."""
     user_id = current_user.id
 
-    # Dummy hash for timing attack prevention
-    dummy_hash = "$2b$12$dummy.hash.to.prevent.timing.attacks.value"
-
-    async with DatabaseConnection() as db:
+    # No connection is held across the bcrypt calls; the guarded UPDATE below
+    # catches a change made in between
+    async with DatabaseConnection(read_only=True) as db:
         row = await db.fetch_one(
             query="SELECT password_hash FROM users WHERE id = ?",
             params=(user_id,),
@@ -110,27 +116,41 @@ async def change_password(data: ChangePassword, current_user: User = Depends(get
 
     if row is None:
         # User doesn't exist - use dummy hash to maintain constant timing
-        AuthService.verify_password(data.old_password, dummy_hash)
+        await bcrypt_pool.verify_password(data.old_password, DUMMY_PASSWORD_HASH)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect password"
         )
 
-    stored_hash = row[0]  # or row['password_hash'] depending on your DB wrapper
+    stored_hash = row[0]
 
-    if not AuthService.verify_password(data.old_password, stored_hash):
+    # bcrypt is deliberately slow; keep it off the event loop
+    if not await bcrypt_pool.verify_password(data.old_password, stored_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect password"
         )
 
-    return await UserService.change_password(
-        email=current_user.email,
-        password=data.new_password
-    )
+    new_hash = await bcrypt_pool.hash_password(data.new_password)
+
+    async with DatabaseConnection() as db:
+        # Match on the hash just verified so a concurrent change can't be overwritten
+        result = await db.execute_one(
+            "UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?",
+            (new_hash, user_id, stored_hash),
+            commit=True
+        )
+
+    if result["rows_affected"] == 0:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Password was changed concurrently, please try again"
+        )
+
+    return {"ok": True, "email": current_user.email}
 
 @router.post("/send-verification-code", status_code=200)
-async def send_verification_code_route(verification_data: VerificationData, background_tasks: BackgroundTasks):
+async def send_verification_code_route(verification_data: VerificationData):
     email = verification_data.email
     verification_type = verification_data.type
     is_email_exists = await email_exists(email)
@@ -147,7 +167,7 @@ async def send_verification_code_route(verification_data: VerificationData, back
             detail="No account found for this email address"
         )
     code = await add_code_into_db(recipient=email)
-    background_tasks.add_task(send_verification_code, email, code)
+    await enqueue_verification_code(email, code)
     return {"ok": True, "message": "Verification code sent"}
 
 @router.post("/regos-integration", response_model=TokenResponse)
@@ -1,58 +1,53 @@
-from fastapi import APIRouter, Request, HTTPException
+import hmac
+from typing import Annotated
+
+from fastapi import APIRouter, Form, HTTPException
 import logging
 
 from src.billing.order_service import OrderService
 from src.billing.payment_service import PaymentService
 from src.billing.subscription_service import SubscriptionService
 from src.core.conf import CLICK_SECRET_KEY
-from src.models.billing import PaymentCreateRequest
+from src.models.billing import PaymentCreateRequest, ClickPayload
 from src.utils.helper import click_generate_sign_string
 
 logger = logging.getLogger("DocVision")
 
 router = APIRouter(prefix="/click", tags=["click"])
 
-def verify_signature(payload: dict) -> bool:
+def verify_signature(payload: ClickPayload) -> bool:
     """Recalculate Click signature and compare"""
     calc_sign = click_generate_sign_string(
-        payload["click_trans_id"],
-        payload["service_id"],
+        payload.click_trans_id,
+        payload.service_id,
         CLICK_SECRET_KEY,
-        payload["merchant_trans_id"],
-        payload.get("merchant_prepare_id", ""),
-        payload["amount"],
-        payload["action"],
-        payload["sign_time"],
+        payload.merchant_trans_id,
+        payload.merchant_prepare_id,
+        payload.amount,
+        payload.action,
+        payload.sign_time,
     )
-    return calc_sign == payload["sign_string"]
+    # Constant-time; bytes because compare_digest rejects non-ASCII str input
+    return hmac.compare_digest(calc_sign.encode(), payload.sign_string.encode())
 
 @router.post("/prepare")
-async def click_prepare(request: Request):
-    payload = dict(await request.form())
-
+async def click_prepare(payload: Annotated[ClickPayload, Form()]):
     # 1️⃣ Verify signature
     if not verify_signature(payload):
         logger.info("SIGN CHECK FAILED")
         return {"error": -1, "error_note": "SIGN CHECK FAILED"}
 
-    # 2️⃣ Validate order exists
-    order_id = payload["merchant_trans_id"]
-    order_data = await OrderService.get_order(order_id)
-    if not order_data and order_data.status != "pending":
-        logger.info("Order not found")
-        return {"error": -5, "error_note": "Order not found"}
-
-
-    if float(payload["amount"]) != float(order_data.amount):
-        return {"error": -2, "error_note": "Incorrect amount"}
-
-    if order_data.status == "paid":
-        return {"error": -2, "error_note": "Order is already paid"}
+    # 2️⃣ Validate order exists, is still pending and the amount matches
+    order_id = payload.merchant_trans_id
+    order_data, error = await OrderService.validate_click_order(order_id, payload.amount)
+    if error:
+        logger.info(error["error_note"])
+        return error
 
     # 3️⃣ Return OK (merchant_prepare_id is usually your internal ID)
     logger.info("Click payment prepared successfully")
     return {
-        "click_trans_id": payload["click_trans_id"],
+        "click_trans_id": payload.click_trans_id,
         "merchant_trans_id": order_id,
         "merchant_prepare_id": order_data.id,
         "error": 0,
@@ -60,22 +55,17 @@ async def click_prepare(request: Request):
     }
 
 @router.post("/complete")
-async def click_complete(request: Request):
-    payload = dict(await request.form())
-
+async def click_complete(payload: Annotated[ClickPayload, Form()]):
     # 1️⃣ Verify signature
     if not verify_signature(payload):
         logger.info("SIGN CHECK FAILED")
         return {"error": -1, "error_note": "SIGN CHECK FAILED"}
 
-    order_id = payload["merchant_trans_id"]
-    order_data = await OrderService.get_order(order_id)
-    if not order_data and order_data.status != "pending":
-        return {"error": -5, "error_note": "Order not found"}
-
-    if float(payload["amount"]) != float(order_data.amount):
-        logger.info("Incorrect amount")
-        return {"error": -2, "error_note": "Incorrect amount"}
+    order_id = payload.merchant_trans_id
+    order_data, error = await OrderService.validate_click_order(order_id, payload.amount)
+    if error:
+        logger.info(error["error_note"])
+        return error
 
     user_id = order_data.user_id
     # Add payment to the db
@@ -94,7 +84,7 @@ async def click_complete(request: Request):
     # 2️⃣ Update order status
     await OrderService.mark_order_paid(
         order_id=order_id,
-        transaction_id=payload["click_trans_id"],
+        transaction_id=payload.click_trans_id,
         payment_provider='click',
         amount=order_data.amount
     )
@@ -110,7 +100,7 @@ async def click_complete(request: Request):
     # 3️⃣ Respond success
     logger.info("Click payment completed successfully")
     return {
-        "click_trans_id": payload["click_trans_id"],
+        "click_trans_id": payload.click_trans_id,
         "merchant_trans_id": order_id,
         "merchant_confirm_id": order_data.id,
         "error": 0,
@@ -1,5 +1,7 @@
 import logging
-from fastapi import APIRouter
+
+import orjson
+from fastapi import APIRouter, Response
 
 from src.translations.translator_service import Translator
 
@@ -8,16 +10,27 @@ router = APIRouter(prefix="/lang", tags=["Languages"])
 
 translator = Translator()
 
+SUPPORTED_LANGUAGES = frozenset({"en", "ru", "uz", "tj"})
+
+# Translation files don't change while the process runs: serialize each payload once
+# and serve the bytes as-is instead of re-encoding the whole dictionary per request
+_TRANSLATIONS_JSON = {
+    lang: orjson.dumps(translator.get_language_translations(lang)) for lang in SUPPORTED_LANGUAGES
+}
+_VERSIONS_JSON = {
+    lang: orjson.dumps(translator.get_language_version(lang)) for lang in SUPPORTED_LANGUAGES
+}
+
+
+def _normalize_lang(lang_code: str) -> str:
+    lang_code = lang_code.lower()
+    return lang_code if lang_code in SUPPORTED_LANGUAGES else "en"
+
+
 @router.get("/{lang_code}")
 async def get_language(lang_code: str):
-    if lang_code.lower() not in ("en", "ru", "uz", "tj"):
-        lang_code = "en"
-
-    return translator.get_language_translations(lang_code)
+    return Response(content=_TRANSLATIONS_JSON[_normalize_lang(lang_code)], media_type="application/json")
 
 @router.get("/{lang_code}/version")
 async def get_version(lang_code: str):
-    if lang_code.lower() not in ("en", "ru", "uz", "tj"):
-        lang_code = "en"
-
-    return translator.get_language_version(lang_code)
+    return Response(content=_VERSIONS_JSON[_normalize_lang(lang_code)], media_type="application/json")
@@ -1,5 +1,6 @@
 import logging
 
+import orjson
 from fastapi import APIRouter, Request, Depends, HTTPException
 
 from src.auth.auth import get_regos_token
@@ -18,8 +19,35 @@ PURCHASE_DOCUMENT_DELETE_ACTIONS = {"DocPurchaseDeleted", "DocPurchaseDeleteMark
 PURCHASE_DOCUMENT_UPDATE_ACTIONS = {"DocPurchaseAdded", "DocPurchaseEdited", "DocPurchasePerformCanceled"}
 router = APIRouter(prefix="/regos", tags=["Regos"])
 
+# Bump the version, move the document between the sets (version as score) and slide
+# the TTLs in one server-side step: one round trip, atomic, and only the EVALSHA on the wire
+_record_purchase_event = redis_client.register_script("""
+local version = redis.call('INCR', KEYS[1])
+redis.call('ZADD', KEYS[2], version, ARGV[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[3], ARGV[2])
+return version
+""")
+
+# Latest version plus both change sets since the client's version, in one round trip.
+# Returns just {latest} when the client is ahead of the server (full sync needed).
+_read_purchase_changes = redis_client.register_script("""
+local latest = tonumber(redis.call('GET', KEYS[1]) or '0')
+local since = tonumber(ARGV[1])
+if since > latest then
+    return {latest}
+end
+return {
+    latest,
+    redis.call('ZRANGEBYSCORE', KEYS[2], since + 1, latest),
+    redis.call('ZRANGEBYSCORE', KEYS[3], since + 1, latest)
+}
+""")
+
 async def check_regos_token(token):
-    async with DatabaseConnection() as db:
+    async with DatabaseConnection(read_only=True) as db:
         result = await db.fetch_one(
             query="SELECT 1 FROM regos_tokens WHERE integration_token=?",
             params=(token,),
@@ -30,15 +58,22 @@ async def check_regos_token(token):
 
 
 
+def _batch_payload(data: RegosBarcodeBatchAdd | RegosProductBatchEdit, path: str) -> dict:
+    """Build a Regos batch request; every sub-request targets the same API path"""
+    # model_dump runs in pydantic-core; the deprecated .dict() shim also warned on every call
+    payload = data.model_dump(exclude_none=True)
+    payload["stop_on_error"] = False
+    for req in payload["requests"]:
+        req["path"] = path
+    return payload
+
+
 @router.post("/barcodes/batch")
 async def batch_edit_regos_products(data: RegosBarcodeBatchAdd, current_user: User = Depends(get_current_user)):
     user_id = current_user.id
     integration_token = await get_regos_token(user_id=user_id)
     endpoint = "batch"
-    filtered_data = data.dict(exclude_none=True)
-    filtered_data["stop_on_error"] = False
-    for req in filtered_data["requests"]:
-        req["path"] = "Barcode/Add"
+    filtered_data = _batch_payload(data, "Barcode/Add")
 
     result = await regos_async_api_request(
         endpoint=endpoint,
@@ -53,10 +88,7 @@ async def batch_edit_regos_products(data: RegosProductBatchEdit, current_user: U
     user_id = current_user.id
     integration_token = await get_regos_token(user_id=user_id)
     endpoint = "batch"
-    filtered_data = data.dict(exclude_none=True)
-    filtered_data["stop_on_error"] = False
-    for req in filtered_data["requests"]:
-        req["path"] = "Item/Edit"
+    filtered_data = _batch_payload(data, "Item/Edit")
 
     result = await regos_async_api_request(
         endpoint=endpoint,
@@ -66,11 +98,9 @@ async def batch_edit_regos_products(data: RegosProductBatchEdit, current_user: U
     return result
 
 
-import json
-
 @router.post("/webhook")
 async def handle_regos_webhook(request: Request):
-    body = await request.json()
+    body = orjson.loads(await request.body())
 
     webhook_token = body.get("connected_integration_id")
     if not webhook_token:
@@ -93,24 +123,17 @@ async def handle_regos_webhook(request: Request):
     updated_zset_key = f"{base_key}:updated_ids"
     deleted_zset_key = f"{base_key}:deleted_ids"
 
-    # Atomic version increment
-    current_version = redis_client.incr(last_version_key)
-
     if event_type in PURCHASE_DOCUMENT_UPDATE_ACTIONS:
-        # Add to updated set with version as score
-        redis_client.zadd(updated_zset_key, {doc_id: current_version})
-        # Remove from deleted set if exists
-        redis_client.zrem(deleted_zset_key, doc_id)
+        # Add to updated set, remove from deleted set if exists
+        added_key, removed_key = updated_zset_key, deleted_zset_key
     else:
-        # Add to deleted set with version as score
-        redis_client.zadd(deleted_zset_key, {doc_id: current_version})
-        # Remove from updated set if exists
-        redis_client.zrem(updated_zset_key, doc_id)
+        # Add to deleted set, remove from updated set if exists
+        added_key, removed_key = deleted_zset_key, updated_zset_key
 
-    # Set TTL for cleanup
-    redis_client.expire(last_version_key, REDIS_TTL_SECONDS)
-    redis_client.expire(updated_zset_key, REDIS_TTL_SECONDS)
-    redis_client.expire(deleted_zset_key, REDIS_TTL_SECONDS)
+    current_version = await _record_purchase_event(
+        keys=[last_version_key, added_key, removed_key],
+        args=[doc_id, REDIS_TTL_SECONDS]
+    )
 
     return {"ok": True, "version": current_version}
 
@@ -128,11 +151,14 @@ async def get_doc_purchase_version(
     updated_zset_key = f"{base_key}:updated_ids"
     deleted_zset_key = f"{base_key}:deleted_ids"
 
-    backend_latest = redis_client.get(last_version_key)
-    backend_latest = int(backend_latest) if backend_latest else 0
+    changes = await _read_purchase_changes(
+        keys=[last_version_key, updated_zset_key, deleted_zset_key],
+        args=[version]
+    )
+    backend_latest = changes[0]
 
     # Frontend ahead → full sync
-    if version > backend_latest:
+    if len(changes) == 1:
         return {
             "full_sync": True,
             "updated_ids": [],
@@ -141,13 +167,11 @@ async def get_doc_purchase_version(
         }
 
     # Incremental fetch using ZSET score
-    updated_ids = redis_client.zrangebyscore(updated_zset_key, version + 1, backend_latest)
-    deleted_ids = redis_client.zrangebyscore(deleted_zset_key, version + 1, backend_latest)
-
+    _, updated_ids, deleted_ids = changes
     return {
         "full_sync": False,
-        "updated_ids": list(map(int, updated_ids)),
-        "deleted_ids": list(map(int, deleted_ids)),
+        "updated_ids": [int(doc_id) for doc_id in updated_ids],
+        "deleted_ids": [int(doc_id) for doc_id in deleted_ids],
         "latest_version": backend_latest
     }
 
@@ -162,16 +186,14 @@ async def proxy_regos_request(endpoint: str, request: Request, current_user: Use
     await SubscriptionService.check_subscription_active(user_id)
     integration_token = await get_regos_token(user_id=user_id)
 
-    try:
-        data = await request.json()
-    except Exception:
-        data = {}
-
+    # Forward the body untouched: parsing it only to serialize it again doubles the work on large batches
+    body = await request.body()
 
     result = await regos_async_api_request(
         endpoint=endpoint,
-        request_data=data,
-        token=integration_token
+        request_data=None,
+        token=integration_token,
+        raw_body=body or b"{}"
     )
 
     return result
@@ -1,13 +1,48 @@
+import asyncio
+import time
 from datetime import datetime
 
 from fastapi import APIRouter
 
 from src.auth.session import SessionManager
-from src.auth.user import UserService
 from src.core.conf import DATABASE_URL, SESSION_EXPIRE_DAYS
+from src.core.db_pool import get_ro
 
 router = APIRouter()
 
+# Health probes can poll many times a second; the counts barely move in between
+SYSTEM_COUNTS_TTL = 2.0
+
+_counts: tuple[int, int] = (0, 0)
+_counts_expire_at = 0.0
+_counts_lock = asyncio.Lock()
+
+
+async def get_system_counts() -> tuple[int, int]:
+    """(active sessions, active users), reused for SYSTEM_COUNTS_TTL seconds"""
+    global _counts, _counts_expire_at
+    if time.monotonic() < _counts_expire_at:
+        return _counts
+
+    # Probes arriving together share one query instead of each running it
+    async with _counts_lock:
+        if time.monotonic() >= _counts_expire_at:
+            _counts = await _query_system_counts()
+            _counts_expire_at = time.monotonic() + SYSTEM_COUNTS_TTL
+    return _counts
+
+
+async def _query_system_counts() -> tuple[int, int]:
+    """(active sessions, active users) in one query on one pooled connection"""
+    async with get_ro() as db:
+        async with db.execute("""
+            SELECT (SELECT COUNT(*) FROM sessions),
+                   (SELECT COUNT(*) FROM users WHERE is_active = TRUE)
+        """) as cursor:
+            row = await cursor.fetchone()
+    return row[0], row[1]
+
+
 @router.get("/api/sessions/cleanup")
 async def manual_cleanup():
     """Manually trigger session cleanup (admin endpoint)"""
@@ -21,8 +56,7 @@ async def manual_cleanup():
 @router.get("/api/health")
 async def health_check():
     """Health check endpoint"""
-    active_sessions = await SessionManager.get_active_sessions_count()
-    total_users = await UserService.get_users_count()
+    active_sessions, total_users = await get_system_counts()
 
     return {
         "status": "healthy",
@@ -36,8 +70,7 @@ async def health_check():
 @router.get("/api/stats")
 async def get_stats():
     """Get system statistics"""
-    active_sessions = await SessionManager.get_active_sessions_count()
-    total_users = await UserService.get_users_count()
+    active_sessions, total_users = await get_system_counts()
 
     return {
         "active_sessions": active_sessions,
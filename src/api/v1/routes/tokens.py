@@ -1,11 +1,10 @@
 from fastapi import APIRouter, Depends
 
-from src.auth.auth import get_regos_token
+from src.auth.auth import get_regos_token, forget_regos_token
 from src.core.db import DatabaseConnection
 from src.core.security import get_current_user
 from src.models.token import RegosTokenCreateUpdate
 from src.models.user import User
-from src.utils.helper import encrypt_token
 
 router = APIRouter(prefix="/tokens", tags=["Tokens"])
 
@@ -25,6 +24,7 @@ async def upsert_regos_token(token_data: RegosTokenCreateUpdate, user_id: str):
             raise_http=True
         )
 
+    await forget_regos_token(user_id)
     return result
 
 @router.post("/regos/upsert")
@@ -48,6 +48,7 @@ async def add_regos_token(token_data: RegosTokenCreateUpdate, current_user: User
             params=(user_id, integration_token)
         )
 
+    await forget_regos_token(user_id)
     return {
         "message": "Token created successfully",
         "token_id": result["inserted_row_id"],
@@ -65,6 +66,7 @@ async def update_regos_token(data: RegosTokenCreateUpdate, current_user: User =
             params=(data.integration_token, user_id)
         )
 
+    await forget_regos_token(user_id)
     return {
         "message": "Token updated successfully",
         "rows_affected": result["rows_affected"]
@@ -79,6 +81,7 @@ async def delete_token(current_user: User = Depends(get_current_user)):
             params=(current_user.id, )
         )
 
+    await forget_regos_token(current_user.id)
     return {
         "message": "Token deleted successfully",
         "rows_affected": result["rows_affected"]
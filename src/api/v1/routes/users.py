@@ -3,10 +3,11 @@ from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException
 from starlette.status import HTTP_400_BAD_REQUEST
 
+from src.auth.auth import forget_email_exists, forget_regos_token
 from src.auth.user import UserService
 from src.core.conf import ADMIN_CODE
 from src.core.db import DatabaseConnection
-from src.core.security import get_current_user
+from src.core.security import get_current_user, invalidate_user_session_cache
 from src.models.user import User, UserUpdate, DeleteUserRequest
 
 router = APIRouter(prefix="/users", tags=["Users"])
@@ -19,6 +20,8 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
 @router.patch("/me")
 async def update_current_user_info(data: UserUpdate, current_user: User = Depends(get_current_user)):
     result = await UserService.update_user(user_data=data)
+    # Cached sessions hold a copy of the user; drop them so the change shows up immediately
+    await invalidate_user_session_cache(data.id)
     return result
 
 
@@ -40,7 +43,11 @@ async def delete_user(data: DeleteUserRequest):
         )
 
     async with DatabaseConnection() as db:
-        await db.execute_one("PRAGMA foreign_keys = ON")
+        row = await db.fetch_one(
+            query="SELECT id FROM users WHERE email = ?",
+            params=(data.email,),
+            allow_none=True
+        )
         await db.execute_one(
             "DELETE FROM users WHERE email = ?",
             (data.email,),
@@ -48,5 +55,11 @@ async def delete_user(data: DeleteUserRequest):
             raise_http=True
         )
 
+    if row is not None:
+        UserService.forget_user(row[0])
+        await invalidate_user_session_cache(row[0])
+        await forget_regos_token(row[0])
+    await forget_email_exists(data.email)
+
     return {"ok": True, "message": "User deleted"}
 
@@ -7,21 +7,35 @@ from typing import Dict, Any
 from fastapi import HTTPException, status
 from jose import JWTError, jwt
 
-from src.core.conf import SESSION_EXPIRE_DAYS, SECRET_KEY, ALGORITHM
+from src.core.conf import SESSION_EXPIRE_DAYS, SECRET_KEY, ALGORITHM, BCRYPT_COST
 from src.core.db import DatabaseConnection
-from src.utils.helper import decrypt_token
+from src.core.redis_client import redis_client
 
 
 logger = logging.getLogger("DocVision")
 
+EMAIL_EXISTS_CACHE_TTL = 60
+REGOS_TOKEN_CACHE_TTL = 300
+# A real hash at the configured cost, checked when there is no user, so that path
+# costs the same as a wrong password (a malformed hash is rejected instantly)
+DUMMY_PASSWORD_HASH = bcrypt.hashpw(b"dummy-password", bcrypt.gensalt(rounds=BCRYPT_COST)).decode('utf-8')
+
 
 class AuthService:
     @staticmethod
     def hash_password(password: str) -> str:
         """Hash a password using bcrypt"""
-        salt = bcrypt.gensalt()
+        salt = bcrypt.gensalt(rounds=BCRYPT_COST)
         return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
 
+    @staticmethod
+    def needs_rehash(hashed: str) -> bool:
+        """True if the hash was made with a different cost than BCRYPT_COST ("$2b$12$..." -> 12)"""
+        try:
+            return int(hashed.split("$")[2]) != BCRYPT_COST
+        except (IndexError, ValueError):
+            return False
+
     @staticmethod
     def verify_password(password: str, hashed: str) -> bool:
         """
@@ -102,7 +116,11 @@ async def get_regos_token(user_id: str) -> str:
         str: string containing regos token
 
     """
-    async with DatabaseConnection() as db:
+    cached = await _get_cached_regos_token(user_id)
+    if cached is not None:
+        return cached
+
+    async with DatabaseConnection(read_only=True) as db:
         # This will raise HTTPException automatically if not found or on error
         regos_tokens = await db.fetch_one(
             query="SELECT integration_token FROM regos_tokens WHERE user_id = ?",
@@ -110,15 +128,79 @@ async def get_regos_token(user_id: str) -> str:
             raise_http=True
         )
 
-    return regos_tokens[0]
+    token = regos_tokens[0]
+    await _set_cached_regos_token(user_id, token)
+    return token
+
+
+def _regos_token_key(user_id: str) -> str:
+    return f"regos_tok:{user_id}"
+
+
+async def _get_cached_regos_token(user_id: str):
+    try:
+        return await redis_client.get(_regos_token_key(user_id))
+    except Exception as e:
+        logger.warning(f"Regos token cache read failed: {e}")
+        return None
+
+
+async def _set_cached_regos_token(user_id: str, token: str) -> None:
+    try:
+        await redis_client.set(_regos_token_key(user_id), token, ex=REGOS_TOKEN_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"Regos token cache write failed: {e}")
+
+
+async def forget_regos_token(user_id: str) -> None:
+    """Drop the cached Regos token (after it is created, changed or deleted)"""
+    try:
+        await redis_client.delete(_regos_token_key(user_id))
+    except Exception as e:
+        logger.warning(f"Regos token cache invalidation failed: {e}")
+
+def _email_exists_key(email: str) -> str:
+    # Not lowercased: the users.email comparison is case-sensitive
+    return f"email_exists:{email}"
+
+
+async def _get_cached_email_exists(email: str):
+    try:
+        return await redis_client.get(_email_exists_key(email))
+    except Exception as e:
+        logger.warning(f"email_exists cache read failed: {e}")
+        return None
+
+
+async def _set_cached_email_exists(email: str, exists: bool) -> None:
+    try:
+        await redis_client.set(_email_exists_key(email), "1" if exists else "0", ex=EMAIL_EXISTS_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"email_exists cache write failed: {e}")
+
+
+async def forget_email_exists(email: str) -> None:
+    """Drop the cached email_exists answer (after creating or deleting a user)"""
+    try:
+        await redis_client.delete(_email_exists_key(email))
+    except Exception as e:
+        logger.warning(f"email_exists cache invalidation failed: {e}")
+
 
 async def email_exists(email: str) -> bool:
-    async with DatabaseConnection() as db:
+    """Read-through cached check; retries of the verification form skip the users table"""
+    cached = await _get_cached_email_exists(email)
+    if cached is not None:
+        return cached == "1"
+
+    async with DatabaseConnection(read_only=True) as db:
         result = await db.fetch_one(
             "SELECT 1 FROM users WHERE email = ?",
             (email,),
             allow_none=True
         )
-    return result is not None
+    exists = result is not None
+    await _set_cached_email_exists(email, exists)
+    return exists
 
 
@@ -0,0 +1,47 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from src.auth.auth import AuthService
+
+logger = logging.getLogger("DocVision")
+
+# bcrypt releases the GIL while hashing, so threads use every core without the
+# pickling and start-up cost of worker processes
+BCRYPT_WORKERS = os.cpu_count() or 4
+# Beyond this many waiting calls a login is refused (503) rather than queued: a few
+# checks per worker is about a second of waiting at the default cost
+BCRYPT_QUEUE_LIMIT = int(os.getenv("BCRYPT_QUEUE_LIMIT") or BCRYPT_WORKERS * 4)
+
+_bcrypt_pool = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+_pending = 0
+
+
+async def _run(func, *args):
+    global _pending
+    if _pending >= BCRYPT_QUEUE_LIMIT:
+        logger.warning(f"bcrypt pool saturated ({_pending} pending), rejecting request")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again",
+            headers={"Retry-After": "1"}
+        )
+
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_bcrypt_pool, func, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    """AuthService.hash_password on the bcrypt pool"""
+    return await _run(AuthService.hash_password, password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    """AuthService.verify_password on the bcrypt pool"""
+    return await _run(AuthService.verify_password, password, hashed)
@@ -1,25 +1,42 @@
+import time
 import uuid
 from datetime import datetime, timedelta
 from typing import Optional
 
-import aiosqlite
-from src.core.conf import SESSION_EXPIRE_DAYS, DATABASE_URL
+from src.core.conf import SESSION_EXPIRE_DAYS
+from src.core.db_pool import get_conn, get_ro
 from src.models.user import Session
 
 
+# The cleanup endpoint is public and the scheduler also runs it hourly; a full
+# DELETE scan more often than this only costs write-lock time
+SESSION_CLEANUP_MIN_INTERVAL = 60
+
+_last_cleanup = float("-inf")
+
+
+def _session_key(session_id: str) -> Optional[bytes]:
+    """Stored form of a session id: the 16 UUID bytes instead of 36 characters of text"""
+    try:
+        return uuid.UUID(session_id).bytes
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
 class SessionManager:
     @staticmethod
     async def create_session(user_id: str) -> Session:
         """Create a new session for a user"""
-        session_id = str(uuid.uuid4())
+        session_uuid = uuid.uuid4()
+        session_id = str(session_uuid)
         now = datetime.utcnow()
         expires_at = now + timedelta(days=SESSION_EXPIRE_DAYS)
 
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with get_conn() as db:
             await db.execute("""
                 INSERT INTO sessions (session_id, user_id, created_at, last_activity, expires_at)
                 VALUES (?, ?, ?, ?, ?)
-            """, (session_id, user_id, now, now, expires_at))
+            """, (session_uuid.bytes, user_id, now, now, expires_at))
             await db.commit()
 
         return Session(
@@ -32,51 +49,89 @@ class SessionManager:
 
     @staticmethod
     async def get_session(session_id: str) -> Optional[Session]:
-        """Get session by ID"""
-        async with aiosqlite.connect(DATABASE_URL) as db:
-            db.row_factory = aiosqlite.Row
+        """Get a session by ID, unless it has expired from inactivity"""
+        key = _session_key(session_id)
+        if key is None:
+            return None
+
+        # Same inactivity rule as cleanup_expired_sessions, so a stale row is never returned
+        cutoff_time = datetime.utcnow() - timedelta(days=SESSION_EXPIRE_DAYS)
+        async with get_ro() as db:
             async with db.execute("""
                 SELECT session_id, user_id, created_at, last_activity, expires_at
-                FROM sessions WHERE session_id = ?
-            """, (session_id,)) as cursor:
+                FROM sessions WHERE session_id = ? AND last_activity >= ?
+            """, (key, cutoff_time)) as cursor:
                 row = await cursor.fetchone()
                 if row:
                     return Session(
-                        session_id=row['session_id'],
+                        session_id=session_id,
                         user_id=row['user_id'],
-                        created_at=datetime.fromisoformat(row['created_at'].replace('Z', '+00:00')) if isinstance(
-                            row['created_at'], str) else row['created_at'],
-                        last_activity=datetime.fromisoformat(row['last_activity'].replace('Z', '+00:00')) if isinstance(
-                            row['last_activity'], str) else row['last_activity'],
-                        expires_at=datetime.fromisoformat(row['expires_at'].replace('Z', '+00:00')) if isinstance(
-                            row['expires_at'], str) else row['expires_at']
+                        created_at=row['created_at'],
+                        last_activity=row['last_activity'],
+                        expires_at=row['expires_at']
                     )
         return None
 
+    @staticmethod
+    async def touch_and_fetch(session_id: str) -> Optional[Session]:
+        """Mark a session active and return it in one statement (None if missing or expired)"""
+        key = _session_key(session_id)
+        if key is None:
+            return None
+
+        now = datetime.utcnow()
+        cutoff_time = now - timedelta(days=SESSION_EXPIRE_DAYS)
+        async with get_conn() as db:
+            async with db.execute("""
+                UPDATE sessions SET last_activity = ?
+                WHERE session_id = ? AND last_activity >= ?
+                RETURNING user_id, created_at, last_activity, expires_at
+            """, (now, key, cutoff_time)) as cursor:
+                row = await cursor.fetchone()
+            await db.commit()
+
+        if not row:
+            return None
+        return Session(
+            session_id=session_id,
+            user_id=row['user_id'],
+            created_at=row['created_at'],
+            last_activity=row['last_activity'],
+            expires_at=row['expires_at']
+        )
+
     @staticmethod
     async def update_activity(session_id: str) -> bool:
         """Update last activity time for a session"""
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        key = _session_key(session_id)
+        if key is None:
+            return False
+
+        async with get_conn() as db:
             cursor = await db.execute("""
                 UPDATE sessions SET last_activity = ? WHERE session_id = ?
-            """, (datetime.utcnow(), session_id))
+            """, (datetime.utcnow(), key))
             await db.commit()
             return cursor.rowcount > 0
 
     @staticmethod
     async def delete_session(session_id: str) -> bool:
         """Delete a session"""
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        key = _session_key(session_id)
+        if key is None:
+            return False
+
+        async with get_conn() as db:
             cursor = await db.execute("""
                 DELETE FROM sessions WHERE session_id = ?
-            """, (session_id,))
+            """, (key,))
             await db.commit()
             return cursor.rowcount > 0
 
     @staticmethod
     async def delete_user_sessions(user_id: str) -> int:
         """Delete all sessions for a user"""
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with get_conn() as db:
             cursor = await db.execute("""
                 DELETE FROM sessions WHERE user_id = ?
             """, (user_id,))
@@ -85,10 +140,20 @@ class SessionManager:
 
     @staticmethod
     async def cleanup_expired_sessions() -> int:
-        """Remove sessions that haven't been active for 10 days"""
+        """
+        Remove sessions that haven't been active for SESSION_EXPIRE_DAYS.
+
+        Runs at most once per SESSION_CLEANUP_MIN_INTERVAL seconds; calls in
+        between return 0 without touching the table.
+        """
+        global _last_cleanup
+        if time.monotonic() - _last_cleanup < SESSION_CLEANUP_MIN_INTERVAL:
+            return 0
+        _last_cleanup = time.monotonic()
+
         cutoff_time = datetime.utcnow() - timedelta(days=SESSION_EXPIRE_DAYS)
 
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with get_conn() as db:
             cursor = await db.execute("""
                 DELETE FROM sessions 
                 WHERE last_activity < ?
@@ -99,7 +164,7 @@ class SessionManager:
     @staticmethod
     async def get_active_sessions_count() -> int:
         """Get count of active sessions"""
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with get_ro() as db:
             async with db.execute("SELECT COUNT(*) FROM sessions") as cursor:
                 row = await cursor.fetchone()
                 return row[0] if row else 0
\ No newline at end of file
@@ -3,17 +3,34 @@ import uuid
 from datetime import datetime
 from typing import Optional
 import aiosqlite
+from cachetools import TTLCache
 from fastapi import HTTPException, status
 import logging
 
-from src.core.conf import DATABASE_URL
+from src.core.db_pool import get_conn, get_ro
 from src.models.user import UserCreateRegos, User, UserUpdate, UserCreate
 from src.utils.helper import validate_password
-from src.auth.auth import AuthService
+from src.auth import bcrypt_pool
+from src.auth.auth import AuthService, forget_email_exists, DUMMY_PASSWORD_HASH
 
 logger = logging.getLogger("DocVision")
 
-FAKE_HASH = "$2b$12$C/Ut9wB4N8GQf8jh0EOYEePUE/vZfnH4RKqGx1LncRHCp/Itg1heg"
+USERNAME_PROBE_BATCH = 20
+# Entries are tagged with the user's session-cache version (sess_ver), which every
+# worker sees in Redis, so a change made on another worker is picked up at once
+USER_CACHE_TTL = 15
+
+_user_cache: TTLCache = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL)
+
+# One fixed statement per login type, so each stays in the connection's statement cache
+_AUTH_QUERY = """
+    SELECT id, username, email, phone, full_name, password_hash, is_active, created_at
+    FROM users 
+    WHERE {field} = ? AND is_active = TRUE
+"""
+AUTH_QUERY_BY_EMAIL = _AUTH_QUERY.format(field="email")
+AUTH_QUERY_BY_PHONE = _AUTH_QUERY.format(field="phone")
+AUTH_QUERY_BY_USERNAME = _AUTH_QUERY.format(field="username")
 
 
 class UserService:
@@ -22,21 +39,23 @@ class UserService:
         # Normalize base (remove spaces, lowercase, etc. — optional)
         base = base.strip().replace(" ", "")
         base = re.sub(r'[^a-zA-Z0-9]', '', base.lower())[:15]
-        username = base
-        counter = 1
+        start = 0
 
+        # Probe candidates in batches (base, base1, ..., base19, then base20...) with one query each
         while True:
+            candidates = [f"{base}{n}" if n else base for n in range(start, start + USERNAME_PROBE_BATCH)]
+            placeholders = ",".join("?" * len(candidates))
             cursor = await db.execute(
-                "SELECT 1 FROM users WHERE username = ?",
-                (username,)
+                f"SELECT username FROM users WHERE username IN ({placeholders})",
+                candidates
             )
-            exists = await cursor.fetchone()
+            taken = {row[0] for row in await cursor.fetchall()}
 
-            if not exists:
-                return username
+            for username in candidates:
+                if username not in taken:
+                    return username
 
-            username = f"{base}{counter}"
-            counter += 1
+            start += USERNAME_PROBE_BATCH
 
     @staticmethod
     async def create_user(user_data: UserCreate | UserCreateRegos, username_gen_type: str = "email") -> User:
@@ -49,13 +68,16 @@ class UserService:
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=is_password_valid["desc"]
             )
-        hashed_password = AuthService.hash_password(user_data.password)
+        hashed_password = await bcrypt_pool.hash_password(user_data.password)
         now = datetime.utcnow()
         email = user_data.email
         full_name = user_data.full_name
 
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with get_conn() as db:
             try:
+                # Take the write lock before picking a username, so two signups can't both
+                # see it as free; the probe and the insert then commit together
+                await db.execute("BEGIN IMMEDIATE")
                 if username_gen_type == "email":
                     username = await UserService.generate_username(db, email.split("@")[0])
                 else:
@@ -67,11 +89,15 @@ class UserService:
                 """, (user_id, username, email, user_data.phone, full_name, hashed_password, True, now))
                 await db.commit()
             except Exception as e:
+                await db.rollback()
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Error: {e}"
                 )
 
+        if email:
+            await forget_email_exists(email)
+
         return User(
             id=user_id,
             username=username,
@@ -85,12 +111,13 @@ class UserService:
     @staticmethod
     async def update_user(user_data: UserUpdate):
         """Update a user"""
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with get_conn() as db:
             try:
                 await db.execute("""
                     UPDATE users SET full_name = ?, username = ? WHERE id = ?
                 """, (user_data.full_name, user_data.username, user_data.id ))
                 await db.commit()
+                UserService.forget_user(user_data.id)
                 return {"ok": True, "message": "User successfully updated"}
 
             except Exception as e:
@@ -103,8 +130,8 @@ class UserService:
 
     @staticmethod
     async def change_password(email: str, password: str) -> dict:
-        hashed_password = AuthService.hash_password(password)
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        hashed_password = await bcrypt_pool.hash_password(password)
+        async with get_conn() as db:
             try:
                 await db.execute("UPDATE users SET password_hash = ? WHERE email = ?", (hashed_password, email))
                 await db.commit()
@@ -129,79 +156,105 @@ class UserService:
     async def authenticate_user(login: str, password: str) -> Optional[User]:
         """Authenticate user with secure comparison"""
 
-        async with aiosqlite.connect(DATABASE_URL) as db:
-            db.row_factory = aiosqlite.Row
-
+        async with get_ro() as db:
             # Determine login type
             if "@" in login:
-                field = "email"
+                query = AUTH_QUERY_BY_EMAIL
             elif login.replace("+", "").isdigit():
-                field = "phone"
+                query = AUTH_QUERY_BY_PHONE
             else:
-                field = "username"
-
-            query = f"""
-                SELECT id, username, email, phone, full_name, password_hash, is_active, created_at
-                FROM users 
-                WHERE {field} = ? AND is_active = TRUE
-            """
+                query = AUTH_QUERY_BY_USERNAME
 
             async with db.execute(query, (login,)) as cursor:
                 row = await cursor.fetchone()
 
-            if not row:
-                # prevent timing attack
-                AuthService.verify_password(password, FAKE_HASH)
-                return None
-
-            if not AuthService.verify_password(password, row['password_hash']):
-                return None
-
-            return User(
-                id=row['id'],
-                username=row['username'],
-                email=row['email'],
-                phone=row['phone'],
-                full_name=row['full_name'],
-                is_active=row['is_active'],
-                created_at=row['created_at']
-            )
+        # The connection is back in the pool before bcrypt runs
+        if not row:
+            # Run a real check on the same pool to prevent a timing attack: a fixed sleep
+            # would miss the queueing a real check sees under load. The pool's queue
+            # limit keeps a flood of unknown logins from tying it up.
+            await bcrypt_pool.verify_password(password, DUMMY_PASSWORD_HASH)
+            return None
+
+        if not await bcrypt_pool.verify_password(password, row['password_hash']):
+            return None
+
+        # The plaintext is only available here, so upgrade hashes made at another cost now
+        if AuthService.needs_rehash(row['password_hash']):
+            await UserService._rehash_password(row['id'], row['password_hash'], password)
+
+        return User(
+            id=row['id'],
+            username=row['username'],
+            email=row['email'],
+            phone=row['phone'],
+            full_name=row['full_name'],
+            is_active=row['is_active'],
+            created_at=row['created_at']
+        )
+
+    @staticmethod
+    async def _rehash_password(user_id: str, old_hash: str, password: str) -> None:
+        try:
+            new_hash = await bcrypt_pool.hash_password(password)
+            async with get_conn() as db:
+                # Skip if the password was changed meanwhile
+                await db.execute(
+                    "UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?",
+                    (new_hash, user_id, old_hash)
+                )
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Password rehash failed for user {user_id}: {e}")
 
     @staticmethod
-    async def get_user_by_id(user_id: str) -> Optional[User]:
-        """Get user by ID"""
-        async with aiosqlite.connect(DATABASE_URL) as db:
-            db.row_factory = aiosqlite.Row
+    async def get_user_by_id(user_id: str, cache_version: Optional[int] = 0) -> Optional[User]:
+        """
+        Get user by ID (served from a short-lived per-process cache when possible).
+
+        An entry cached under a different cache_version is refetched; None always reads the table.
+        """
+        cached = _user_cache.get(user_id) if cache_version is not None else None
+        if cached is not None and cached[1] == cache_version:
+            return cached[0]
+
+        async with get_ro() as db:
             async with db.execute("""
                 SELECT id, username, email, phone, full_name, is_active, created_at
                 FROM users WHERE id = ? AND is_active = TRUE
             """, (user_id,)) as cursor:
                 row = await cursor.fetchone()
                 if row:
-                    return User(
+                    user = User(
                         id=row['id'],
                         username=row['username'],
                         email=row['email'],
                         phone=row["phone"],
                         full_name=row['full_name'],
                         is_active=row['is_active'],
-                        created_at=datetime.fromisoformat(row['created_at'].replace('Z', '+00:00')) if isinstance(
-                            row['created_at'], str) else row['created_at']
+                        created_at=row['created_at']
                     )
+                    if cache_version is not None:
+                        _user_cache[user_id] = (user, cache_version)
+                    return user
         return None
 
+    @staticmethod
+    def forget_user(user_id: str) -> None:
+        """Drop a user from this process's cache (after it is changed or deleted)"""
+        _user_cache.pop(user_id, None)
+
     @staticmethod
     async def get_users_count() -> int:
         """Get total count of active users"""
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with get_ro() as db:
             async with db.execute("SELECT COUNT(*) FROM users WHERE is_active = TRUE") as cursor:
                 row = await cursor.fetchone()
                 return row[0] if row else 0
 
     @staticmethod
     async def get_user_by_phone(phone: str) -> Optional[User]:
-        async with aiosqlite.connect(DATABASE_URL) as db:
-            db.row_factory = aiosqlite.Row
+        async with get_ro() as db:
             async with db.execute("""
                 SELECT id, username, email, phone, full_name, is_active, created_at
                 FROM users WHERE phone = ? AND is_active = TRUE
@@ -215,7 +268,6 @@ class UserService:
                         phone=row["phone"],
                         full_name=row['full_name'],
                         is_active=row['is_active'],
-                        created_at=datetime.fromisoformat(row['created_at'].replace('Z', '+00:00')) if isinstance(
-                            row['created_at'], str) else row['created_at']
+                        created_at=row['created_at']
                     )
         return None
\ No newline at end of file
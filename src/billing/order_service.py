@@ -1,6 +1,9 @@
 from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+import logging
 import uuid
-import json
+import orjson
+from cachetools import TTLCache
 from typing import Optional, List
 from fastapi import HTTPException, status
 
@@ -8,26 +11,32 @@ from src.core.db import DatabaseConnection
 from src.core.conf import PRICING, ORDER_EXPIRATION_HOURS
 from src.models.billing import OrderCreate, Order
 
+logger = logging.getLogger("DocVision")
+
+# Discount for longer subscriptions, indexed by months (12 and above use the last entry):
+# 5% for 3-5 months, 10% for 6-11, 20% for 12+
+_DISCOUNT_BY_MONTHS = (0.0,) * 3 + (0.05,) * 3 + (0.10,) * 6 + (0.20,)
+# Payment status polls are served from memory this long; this process's own state
+# changes update the entry at once, and state changes read the table directly
+ORDER_CACHE_TTL = 5
+
+# Order lists per (user_id, status), warmed at login for the billing page that usually follows.
+# Invalidation is per process, so a payment handled by another worker shows up after at
+# most this long; kept as short as the single-order cache for that reason
+USER_ORDERS_CACHE_TTL = ORDER_CACHE_TTL
+
+_order_cache: TTLCache = TTLCache(maxsize=10_000, ttl=ORDER_CACHE_TTL)
+_user_orders_cache: TTLCache = TTLCache(maxsize=10_000, ttl=USER_ORDERS_CACHE_TTL)
+
 
 class OrderService:
     @staticmethod
     def calculate_order_amount(plan: str, months: int) -> float:
         """Calculate total order amount"""
         price_per_month = PRICING.get(plan, 0)
+        discount = _DISCOUNT_BY_MONTHS[min(max(months, 0), 12)]
 
-        # Apply discounts for longer subscriptions
-        discount = 0
-        if months >= 12:
-            discount = 0.20  # 20% discount for 12+ months
-        elif months >= 6:
-            discount = 0.10  # 10% discount for 6-11 months
-        elif months >= 3:
-            discount = 0.05  # 5% discount for 3-5 months
-
-        total = price_per_month * months
-        discounted_total = total * (1 - discount)
-
-        return round(discounted_total, 2)
+        return round(price_per_month * months * (1 - discount), 2)
 
     @staticmethod
     async def create_order(user_id: str, subscription_plan: str, order_data: OrderCreate) -> Order:
@@ -46,37 +55,44 @@ class OrderService:
         expires_at = datetime.utcnow() + timedelta(hours=ORDER_EXPIRATION_HOURS)
 
         async with DatabaseConnection() as db:
+            # Both statements run in one transaction; RETURNING hands back the new row,
+            # so no follow-up SELECT is needed
             await db.execute_one(
                 query="UPDATE orders SET status = 'cancelled' WHERE user_id = ? AND status = 'pending'",
                 params=(user_id, ),
                 commit=False
             )
-            await db.execute_one(
+            row = await db.fetch_one(
                 query="""
                     INSERT INTO orders (
                         id, user_id, plan, months, amount, currency, 
                         status, payment_provider, created_at, expires_at
                     )
                     VALUES (?, ?, ?, ?, ?, 'UZS', 'pending', ?, ?, ?)
+                    RETURNING *
                 """,
                 params=(
                     order_id, user_id, order_data.plan, order_data.months,
                     amount, order_data.payment_provider, datetime.utcnow(), expires_at
-                ),
-                commit=True
+                )
             )
+            await db.connection.commit()
 
-            # Fetch the created order
-            row = await db.fetch_one(
-                query="SELECT * FROM orders WHERE id = ?",
-                params=(order_id,)
-            )
+        # The user's previous pending order was just cancelled
+        for cached in [o for o in _order_cache.values() if o.user_id == user_id and o.status == 'pending']:
+            _order_cache.pop(cached.id, None)
+        OrderService._forget_user_orders(user_id)
 
-        return OrderService._row_to_order(row)
+        return OrderService._cache_order(OrderService._row_to_order(row))
 
     @staticmethod
-    async def get_order(order_id: str) -> Optional[Order]:
-        """Get order by ID"""
+    async def get_order(order_id: str, cached: bool = True) -> Optional[Order]:
+        """Get order by ID (cached=False reads the table, for checks before a state change)"""
+        if cached:
+            order = _order_cache.get(order_id)
+            if order is not None:
+                return order
+
         async with DatabaseConnection() as db:
             row = await db.fetch_one(
                 query="SELECT * FROM orders WHERE id = ?",
@@ -87,11 +103,43 @@ class OrderService:
         if not row:
             return None
 
-        return OrderService._row_to_order(row)
+        return OrderService._cache_order(OrderService._row_to_order(row))
+
+    @staticmethod
+    async def validate_click_order(order_id: str, amount: str) -> tuple[Optional[Order], Optional[dict]]:
+        """
+        Check an order for a Click prepare/complete callback.
+
+        Returns (order, None) when the order is pending and the posted amount
+        matches, otherwise (order or None, Click error response).
+        """
+        order = await OrderService.get_order(order_id, cached=False)
+        if not order:
+            return None, {"error": -5, "error_note": "Order not found"}
+
+        if order.status == "paid":
+            return order, {"error": -4, "error_note": "Order is already paid"}
+
+        if order.status != "pending":
+            return order, {"error": -9, "error_note": f"Order is {order.status}"}
+
+        # Decimal, not float: the posted amount is a string and must match exactly
+        try:
+            amount_ok = Decimal(amount) == Decimal(str(order.amount))
+        except InvalidOperation:
+            amount_ok = False
+        if not amount_ok:
+            return order, {"error": -2, "error_note": "Incorrect amount"}
+
+        return order, None
 
     @staticmethod
     async def get_user_orders(user_id: str, status: Optional[str] = None) -> List[Order]:
         """Get all orders for a user, optionally filtered by status"""
+        orders = _user_orders_cache.get((user_id, status))
+        if orders is not None:
+            return list(orders)
+
         async with DatabaseConnection() as db:
             if status:
                 rows = await db.fetch_all(
@@ -104,7 +152,19 @@ class OrderService:
                     params=(user_id,)
                 )
 
-        return [OrderService._row_to_order(row) for row in rows]
+        orders = [OrderService._row_to_order(row) for row in rows]
+        _user_orders_cache[(user_id, status)] = orders
+        return list(orders)
+
+    @staticmethod
+    async def prefetch_user_orders(user_id: str) -> None:
+        """Warm the get_user_orders cache in the background (e.g. right after login)"""
+        try:
+            await OrderService.get_user_orders(user_id)
+        except HTTPException:
+            pass  # No orders yet, nothing to warm
+        except Exception as e:
+            logger.warning(f"Order prefetch failed for user {user_id}: {e}")
 
     @staticmethod
     async def mark_order_paid(
@@ -115,7 +175,7 @@ class OrderService:
             metadata: Optional[dict] = None
     ) -> Order:
         """Mark an order as paid"""
-        order = await OrderService.get_order(order_id)
+        order = await OrderService.get_order(order_id, cached=False)
 
         if not order:
             raise HTTPException(
@@ -142,10 +202,10 @@ class OrderService:
                 detail=f"Payment amount mismatch. Expected: {order.amount}, Received: {amount}"
             )
 
-        metadata_str = json.dumps(metadata) if metadata else None
+        metadata_str = orjson.dumps(metadata).decode() if metadata else None
 
         async with DatabaseConnection() as db:
-            await db.execute_one(
+            row = await db.fetch_one(
                 query="""
                     UPDATE orders 
                     SET status = 'paid', 
@@ -154,16 +214,14 @@ class OrderService:
                         payment_provider = ?,
                         metadata = ?
                     WHERE id = ?
+                    RETURNING *
                 """,
                 params=(datetime.utcnow(), transaction_id, payment_provider, metadata_str, order_id)
             )
+            await db.connection.commit()
 
-            row = await db.fetch_one(
-                query="SELECT * FROM orders WHERE id = ?",
-                params=(order_id,)
-            )
-
-        return OrderService._row_to_order(row)
+        OrderService._forget_user_orders(order.user_id)
+        return OrderService._cache_order(OrderService._row_to_order(row))
 
     @staticmethod
     async def mark_order_failed(
@@ -172,7 +230,7 @@ class OrderService:
             metadata: Optional[dict] = None
     ) -> Order:
         """Mark an order as failed"""
-        order = await OrderService.get_order(order_id)
+        order = await OrderService.get_order(order_id, cached=False)
 
         if not order:
             raise HTTPException(
@@ -186,31 +244,29 @@ class OrderService:
                 detail="Cannot mark paid order as failed"
             )
 
-        metadata_str = json.dumps(metadata) if metadata else None
+        metadata_str = orjson.dumps(metadata).decode() if metadata else None
 
         async with DatabaseConnection() as db:
-            await db.execute_one(
+            row = await db.fetch_one(
                 query="""
                     UPDATE orders 
                     SET status = 'failed',
                         payment_transaction_id = ?,
                         metadata = ?
                     WHERE id = ?
+                    RETURNING *
                 """,
                 params=(transaction_id, metadata_str, order_id)
             )
+            await db.connection.commit()
 
-            row = await db.fetch_one(
-                query="SELECT * FROM orders WHERE id = ?",
-                params=(order_id,)
-            )
-
-        return OrderService._row_to_order(row)
+        OrderService._forget_user_orders(order.user_id)
+        return OrderService._cache_order(OrderService._row_to_order(row))
 
     @staticmethod
     async def cancel_order(order_id: str) -> Order:
         """Cancel an order"""
-        order = await OrderService.get_order(order_id)
+        order = await OrderService.get_order(order_id, cached=False)
 
         if not order:
             raise HTTPException(
@@ -231,21 +287,19 @@ class OrderService:
             )
 
         async with DatabaseConnection() as db:
-            await db.execute_one(
-                query="UPDATE orders SET status = 'cancelled' WHERE id = ?",
-                params=(order_id,)
-            )
-
             row = await db.fetch_one(
-                query="SELECT * FROM orders WHERE id = ?",
+                query="UPDATE orders SET status = 'cancelled' WHERE id = ? RETURNING *",
                 params=(order_id,)
             )
+            await db.connection.commit()
 
-        return OrderService._row_to_order(row)
+        OrderService._forget_user_orders(order.user_id)
+        return OrderService._cache_order(OrderService._row_to_order(row))
 
     @staticmethod
     async def expire_old_orders():
         """Expire orders that haven't been paid within the expiration time"""
+        now = datetime.utcnow()
         async with DatabaseConnection() as db:
             result = await db.execute_one(
                 query="""
@@ -254,26 +308,29 @@ class OrderService:
                     WHERE status = 'pending' 
                     AND expires_at < ?
                 """,
-                params=(datetime.utcnow(),)
+                params=(now,)
             )
 
+        if result.get("rows_affected", 0):
+            for cached in [o for o in _order_cache.values() if o.status == 'pending' and o.expires_at and o.expires_at < now]:
+                _order_cache.pop(cached.id, None)
+            _user_orders_cache.clear()
+
         return result.get("rows_affected", 0)
 
+    @staticmethod
+    def _forget_user_orders(user_id: str) -> None:
+        for key in [key for key in _user_orders_cache if key[0] == user_id]:
+            _user_orders_cache.pop(key, None)
+
+    @staticmethod
+    def _cache_order(order: Order) -> Order:
+        _order_cache[order.id] = order
+        return order
+
     @staticmethod
     def _row_to_order(row) -> Order:
         """Convert core row to Order model"""
-        return Order(
-            id=row[0],
-            user_id=row[1],
-            plan=row[2],
-            months=row[3],
-            amount=row[4],
-            currency=row[5],
-            status=row[6],
-            payment_provider=row[7],
-            payment_transaction_id=row[8],
-            created_at=row[9],
-            paid_at=row[10],
-            expires_at=row[11],
-            metadata=row[12]
-        )
\ No newline at end of file
+        # Columns by name, not position; model_construct skips validation, since the
+        # table's CHECK constraints and TIMESTAMP converter already give the right types
+        return Order.model_construct(**dict(row))
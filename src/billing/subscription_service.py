@@ -330,6 +330,45 @@ class SubscriptionService:
                 logger.error(err_msg)
                 return {"ok": False, "message": err_msg, "code": 500}
 
+    @staticmethod
+    async def refund_ai_usage_operation(user_id: str, amount: int = 1) -> None:
+        """
+        Give back credits deducted by save_ai_usage_operation when the AI work never ran.
+        Args:
+            user_id (str): User ID.
+            amount (int): Amount of AI usage to return.
+        """
+        async with DatabaseConnection() as db:
+            try:
+                sub_row = await db.fetch_one(
+                    query="SELECT id FROM subscriptions WHERE user_id = ?",
+                    params=(user_id,),
+                    allow_none=True
+                )
+                if not sub_row:
+                    logger.error(f"[AIUsage] Subscription not found for refund, user id: {user_id}")
+                    return
+
+                sub_id = sub_row["id"]
+                await db.execute_one(
+                    query="INSERT INTO ai_processing_operations (subscription_id, amount, is_positive) VALUES (?, ?, 1)",
+                    params=(sub_id, amount),
+                    commit=False
+                )
+
+                await db.execute_one(
+                    query="UPDATE subscriptions SET ai_processing = ai_processing + ? WHERE id = ?",
+                    params=(amount, sub_id),
+                    commit=False
+                )
+
+                await db.connection.commit()
+                logger.info(f"[AIUsage] Refunded {amount} credits to {sub_id}")
+
+            except Exception as e:
+                await db.connection.rollback()
+                logger.error(f"[AIUsage ERROR] Failed to refund usage for user {user_id}: {e}")
+
     @staticmethod
     async def activate_subscription(user_id: str, plan: str, months: int) -> Subscription:
         """
@@ -430,8 +469,8 @@ class SubscriptionService:
             amount = float(payment_data.get("amount", 0))
             metadata = payment_data
 
-            # Step 2. Retrieve and verify_service order
-            order = await OrderService.get_order(order_id)
+            # Step 2. Retrieve and verify_service order (uncached: a paid order must be seen as paid)
+            order = await OrderService.get_order(order_id, cached=False)
             if not order:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -27,11 +27,23 @@ CLICK_MERCHANT_ID = os.getenv("CLICK_MERCHANT_ID")
 CLICK_SERVICE_ID = os.getenv("CLICK_SERVICE_ID")
 CLICK_MERCHANT_USER_ID = os.getenv("CLICK_MERCHANT_USER_ID")
 CLICK_SECRET_KEY = os.getenv("CLICK_SECRET_KEY")
-ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.heic', '.heif', ".mpo", ".pdf"}
+ALLOWED_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.heic', '.heif', ".mpo", ".pdf"})
 ENVIRONMENT = os.getenv("ENVIRONMENT")
 ADMIN_CODE = os.getenv("ADMIN_CODE")
 
 MAX_FILE_SIZE = 5 * 1024 * 1024
+# Uploads above this are rejected while reading, before any compression attempt
+MAX_UPLOAD_SIZE = 4 * MAX_FILE_SIZE
+# Shared worker pool for blocking AI/file work (~7/8 of the cores, at least 4)
+DOCVISION_IO_WORKERS = int(os.getenv("DOCVISION_IO_WORKERS") or max(4, (os.cpu_count() or 4) * 7 // 8))
+# Threads that only wait on blocking model SDK calls; sized for concurrent requests, not cores
+DOCVISION_NETWORK_WORKERS = int(os.getenv("DOCVISION_NETWORK_WORKERS") or 32)
+# bcrypt work factor for new hashes; older hashes are upgraded on the next login
+BCRYPT_COST = int(os.getenv("BCRYPT_COST") or 12)
+# SQLite connections kept open and shared by all requests (see src/core/db_pool.py)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE") or 5)
+# Readers run in parallel under WAL, so they scale with the cores (writers queue on one lock anyway)
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE") or (os.cpu_count() or 2) * 2)
 # Order expiration (unpaid orders expire after this time)
 ORDER_EXPIRATION_HOURS = 24
 # Webhook secret key (for validating webhook requests)
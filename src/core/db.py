@@ -1,9 +1,12 @@
+import uuid
+
 import aiosqlite
 from typing import Any, Dict, List, Optional, Tuple, Union
 from fastapi import HTTPException
 import logging
 
 from src.core.conf import DATABASE_URL
+from src.core.db_pool import get_conn, get_ro
 
 logger = logging.getLogger("DocVision")
 
@@ -130,24 +133,29 @@ class DatabaseConnection:
 
         print("Migration completed successfully!")
 
-    def __init__(self, db_path: str = DATABASE_URL):
+    def __init__(self, db_path: str = DATABASE_URL, read_only: bool = False):
         self.db_path = db_path
+        self.read_only = read_only
         self.connection = None
+        self._lease = None
 
     async def __aenter__(self):
         try:
-            self.connection = await aiosqlite.connect(self.db_path)
-            self.connection.row_factory = aiosqlite.Row  # Enable dict-like row access
-            logger.info(f"Connected to core: {self.db_path}")
+            if self.db_path == DATABASE_URL:
+                # Borrow an open connection from the shared pool instead of opening one per request
+                self._lease = get_ro() if self.read_only else get_conn()
+                self.connection = await self._lease.__aenter__()
+            else:
+                self.connection = await aiosqlite.connect(self.db_path)
+                self.connection.row_factory = aiosqlite.Row  # Enable dict-like row access
+                logger.info(f"Connected to core: {self.db_path}")
             return self
         except Exception as e:
             logger.error(f"Failed to connect to core {self.db_path}: {e}")
             raise HTTPException(status_code=500, detail=f"Database connection failed: {e}")
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.connection:
-            await self.connection.close()
-            logger.info(f"Closed core connection: {self.db_path}")
+        await self.close()
 
     def _ensure_connection(self):
         """Ensure connection is available"""
@@ -181,7 +189,7 @@ class DatabaseConnection:
             # Create sessions table
             await db.execute("""
                   CREATE TABLE IF NOT EXISTS sessions (
-                      session_id TEXT PRIMARY KEY,
+                      session_id BLOB PRIMARY KEY,
                       user_id TEXT NOT NULL,
                       created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                       last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -286,6 +294,16 @@ class DatabaseConnection:
                     WHERE phone IS NOT NULL AND phone <> '';
                 """)
 
+            # The partial unique indexes above only enforce uniqueness: "email = ?" does not
+            # imply "email <> ''", so the planner can't use them and login lookups scanned users
+            await db.execute("""
+                  CREATE INDEX IF NOT EXISTS idx_users_email ON users (email)
+              """)
+
+            await db.execute("""
+                  CREATE INDEX IF NOT EXISTS idx_users_phone ON users (phone)
+              """)
+
             await db.execute("""
                   CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions (user_id)
               """)
@@ -310,6 +328,20 @@ class DatabaseConnection:
                   CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status)
               """)
 
+            # Partial index: expire_old_orders reads only the pending rows, not the whole order history
+            await db.execute("""
+                  CREATE INDEX IF NOT EXISTS idx_orders_pending_expiry ON orders (expires_at) WHERE status = 'pending'
+              """)
+
+            # get_user_orders walks these in created_at order instead of sorting the user's rows
+            await db.execute("""
+                  CREATE INDEX IF NOT EXISTS idx_orders_user_created ON orders (user_id, created_at DESC)
+              """)
+
+            await db.execute("""
+                  CREATE INDEX IF NOT EXISTS idx_orders_user_status_created ON orders (user_id, status, created_at DESC)
+              """)
+
             await db.execute("""
                   CREATE INDEX IF NOT EXISTS idx_orders_payment_transaction_id ON orders (payment_transaction_id)
               """)
@@ -318,8 +350,30 @@ class DatabaseConnection:
                  CREATE INDEX IF NOT EXISTS idx_verification_codes_recipient ON verification_codes (recipient)
              """)
 
+            await DatabaseConnection.migrate_session_ids(db)
+
             await db.commit()
 
+    @staticmethod
+    async def migrate_session_ids(db):
+        """Convert session ids stored as UUID text to 16-byte blobs (older databases)"""
+        cursor = await db.execute("SELECT rowid, session_id FROM sessions WHERE typeof(session_id) = 'text'")
+        rows = await cursor.fetchall()
+        if not rows:
+            return
+
+        converted, invalid = [], []
+        for rowid, session_id in rows:
+            try:
+                converted.append((uuid.UUID(session_id).bytes, rowid))
+            except ValueError:
+                invalid.append((rowid,))
+
+        # A TEXT-declared column keeps blob values as they are, so no table rebuild is needed
+        await db.executemany("UPDATE sessions SET session_id = ? WHERE rowid = ?", converted)
+        await db.executemany("DELETE FROM sessions WHERE rowid = ?", invalid)
+        logger.info(f"Converted {len(converted)} session ids to blobs, dropped {len(invalid)} invalid")
+
     async def fetch_one(
             self,
             query: str,
@@ -730,8 +784,12 @@ class DatabaseConnection:
             raise
 
     async def close(self):
-        """Manually close the core connection"""
-        if self.connection:
+        """Manually close the core connection (pooled connections go back to the pool)"""
+        if self._lease is not None:
+            lease, self._lease = self._lease, None
+            self.connection = None
+            await lease.__aexit__(None, None, None)
+        elif self.connection:
             await self.connection.close()
             self.connection = None
-            logger.info(f"Manually closed core connection: {self.db_path}")
\ No newline at end of file
+            logger.info(f"Closed core connection: {self.db_path}")
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import sqlite3
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncContextManager, AsyncIterator, Optional
+
+import aiosqlite
+
+from src.core.conf import DATABASE_URL, DB_POOL_SIZE, DB_READ_POOL_SIZE
+
+logger = logging.getLogger("DocVision")
+
+STATEMENT_CACHE_SIZE = 256
+
+# Applied once per pooled connection. WAL lets readers run alongside the writer and
+# turns commits into appends; synchronous=NORMAL drops the per-commit fsync (WAL
+# stays consistent, only the last commits can be lost on power failure).
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys=ON",  # ON DELETE CASCADE everywhere, not only where a route remembered it
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",  # 64 MiB page cache per connection
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA mmap_size=268435456",
+)
+# Read-only connections skip the settings that write or only matter to writers
+READ_ONLY_PRAGMAS = (
+    "PRAGMA query_only=ON",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+def _convert_timestamp(value: bytes) -> datetime | str:
+    """TIMESTAMP column -> datetime, parsed once in C; unparseable legacy text is passed through"""
+    text = value.decode()
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return text
+    # Timestamps are naive UTC everywhere else; don't let a stray offset make comparisons raise
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+# Columns declared TIMESTAMP come back as datetime, so callers stop re-parsing strings.
+# The explicit adapter keeps writing the format the stdlib default did ("YYYY-MM-DD HH:MM:SS[.ffffff]",
+# which still sorts and compares correctly against CURRENT_TIMESTAMP values); the default one is
+# deprecated since Python 3.12.
+sqlite3.register_converter("TIMESTAMP", _convert_timestamp)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+
+
+async def _open_connection(read_only: bool = False) -> aiosqlite.Connection:
+    # Pooled connections live for the whole process, so a larger statement cache
+    # (default 128) keeps every query the app issues parsed and planned
+    if read_only:
+        connection = await aiosqlite.connect(
+            f"{Path(DATABASE_URL).resolve().as_uri()}?mode=ro",
+            uri=True,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+    else:
+        connection = await aiosqlite.connect(
+            DATABASE_URL,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+    connection.row_factory = aiosqlite.Row  # Enable dict-like row access
+    for pragma in READ_ONLY_PRAGMAS if read_only else CONNECTION_PRAGMAS:
+        await connection.execute(pragma)
+    return connection
+
+
+class _ConnectionPool:
+    """
+    Fixed set of open connections handed out through an asyncio.Queue.
+
+    Each aiosqlite connection owns a worker thread; keeping a few open saves the
+    thread start, file open and schema read that every request used to pay.
+    """
+
+    def __init__(self, size: int, read_only: bool = False):
+        self.size = size
+        self.read_only = read_only
+        self._idle: Optional[asyncio.Queue] = None
+        self._connections: list[aiosqlite.Connection] = []
+        self._init_lock = asyncio.Lock()
+
+    async def open(self) -> None:
+        async with self._init_lock:
+            if self._idle is not None:
+                return
+            idle = asyncio.Queue()
+            for _ in range(self.size):
+                connection = await _open_connection(self.read_only)
+                self._connections.append(connection)
+                idle.put_nowait(connection)
+            self._idle = idle
+            kind = "read-only" if self.read_only else "read-write"
+            logger.info(f"Database pool opened: {self.size} {kind} connections to {DATABASE_URL}")
+
+    async def close(self) -> None:
+        self._idle = None
+        while self._connections:
+            connection = self._connections.pop()
+            try:
+                await connection.close()
+            except Exception as e:
+                logger.warning(f"Failed to close pooled database connection: {e}")
+
+    async def _release(self, connection: aiosqlite.Connection) -> None:
+        """Return a connection to the pool, never handing on an open transaction"""
+        idle = self._idle
+        if idle is None or connection not in self._connections:
+            # Pool was closed (or reopened) while the connection was borrowed
+            await connection.close()
+            return
+
+        try:
+            if connection.in_transaction:
+                await connection.rollback()
+        except Exception as e:
+            logger.warning(f"Replacing broken pooled database connection: {e}")
+            self._connections.remove(connection)
+            try:
+                await connection.close()
+            except Exception:
+                pass
+            try:
+                connection = await _open_connection(self.read_only)
+            except Exception as e:
+                logger.error(f"Could not reopen pooled database connection: {e}")
+                return
+            self._connections.append(connection)
+        idle.put_nowait(connection)
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        if self._idle is None:
+            await self.open()
+        connection = await self._idle.get()
+        try:
+            yield connection
+        finally:
+            await self._release(connection)
+
+
+_rw_pool = _ConnectionPool(DB_POOL_SIZE)
+# WAL readers never wait for the writer, so reads get their own connections
+_ro_pool = _ConnectionPool(DB_READ_POOL_SIZE, read_only=True)
+
+
+async def init_db_pool() -> None:
+    """Open the pooled connections (called from the app lifespan; also done lazily on first use)"""
+    # Read-write first: it switches the database to WAL, which read-only connections can't do
+    await _rw_pool.open()
+    await _ro_pool.open()
+
+
+async def close_db_pool() -> None:
+    """Close every pooled connection (called from the app lifespan)"""
+    await _ro_pool.close()
+    await _rw_pool.close()
+
+
+def get_rw() -> AsyncContextManager[aiosqlite.Connection]:
+    """
+    Borrow a read-write connection for the duration of the block.
+
+    Waits when every connection is in use. Anything left uncommitted when the
+    block exits is rolled back before the connection is reused.
+    """
+    return _rw_pool.connection()
+
+
+def get_ro() -> AsyncContextManager[aiosqlite.Connection]:
+    """Borrow a read-only connection (queries only; writes raise) for the duration of the block"""
+    return _ro_pool.connection()
+
+
+# The original name; code that both reads and writes keeps using it
+get_conn = get_rw
@@ -1,24 +1,49 @@
+import asyncio
+import inspect
 from contextlib import asynccontextmanager
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import logging
 
 from src.core.db import DatabaseConnection
+from src.core.db_pool import init_db_pool, close_db_pool
+from src.core.redis_client import redis_client
+from src.core.regos_api import close_regos_session
 from src.core.dependencies import regenerate_credits_daily, regenerate_monthly, cleanup_sessions_hourly, \
     cleanup_expired_orders_hourly
 from src.utils.helper import delete_all_files
+from src.ai_service.ai_helper import shutdown_pdf_pool
+from src.ai_service.jobs import cancel_ai_jobs
+from src.ai_service.gemini_ai import warm_up_gemini_client, shutdown_page_request_pool
 from src.verify_service.async_smtp_verify_service import clean_verification_data
+from src.verify_service.resend_verify_service import start_email_workers, stop_email_workers
 
 scheduler = AsyncIOScheduler()
 database_connection = DatabaseConnection()
 logger = logging.getLogger("DocVision")
 
 
+async def _shutdown_step(name: str, step) -> None:
+    """Run one shutdown step (sync or async); a failure is logged so the remaining steps still run"""
+    try:
+        result = step()
+        if inspect.isawaitable(result):
+            await result
+    except Exception as e:
+        logger.error(f"[Lifespan] {name} failed during shutdown: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app):
     # Initialize core
     await database_connection.init_db()
     logger.info("Database initialized")
+    await init_db_pool()
+
+    # Open the shared Gemini connection in the background so startup isn't delayed
+    warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up_gemini_client))
+
+    start_email_workers()
 
     # --- Startup phase ---
     scheduler.start()
@@ -82,11 +107,18 @@ async def lifespan(app):
 
     logger.info("Cleanup and regeneration tasks started")
 
-    yield
-
     # Cancel the cleanup tasks
     try:
         yield
     finally:
-        scheduler.shutdown(wait=False)
+        await _shutdown_step("APScheduler", lambda: scheduler.shutdown(wait=False))
         logger.info("[Lifespan] APScheduler stopped.")
+        warm_up_task.cancel()
+        # Before Redis closes: interrupted jobs record their final state there
+        await _shutdown_step("AI jobs", cancel_ai_jobs)
+        await _shutdown_step("Email workers", stop_email_workers)
+        await _shutdown_step("Redis client", redis_client.aclose)
+        await _shutdown_step("Regos session", close_regos_session)
+        await _shutdown_step("PDF pool", shutdown_pdf_pool)
+        await _shutdown_step("Page request pool", shutdown_page_request_pool)
+        await _shutdown_step("Database pool", close_db_pool)
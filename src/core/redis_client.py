@@ -1,8 +1,11 @@
-import redis
+import redis.asyncio as redis
 
+# Async client: commands are awaited on the event loop instead of blocking it.
+# The client keeps a connection pool, so concurrent requests don't queue on one socket.
 redis_client = redis.Redis(
     host="localhost",
     port=6379,
     db=0,
     decode_responses=True,  # strings instead of bytes
+    max_connections=100,
 )
@@ -1,13 +1,36 @@
 import aiohttp
-import json
+import orjson
 import asyncio
 from fastapi import HTTPException
 import logging
 
 logger = logging.getLogger("DocVision")
 
-async def regos_async_api_request(endpoint: str, request_data: dict | list, token: str,
-                                  timeout_seconds: int = 30) -> dict:
+REGOS_MAX_CONNECTIONS = 100
+
+_session: aiohttp.ClientSession | None = None
+
+
+def _get_session() -> aiohttp.ClientSession:
+    """Shared session, so calls reuse pooled keep-alive connections instead of a new TLS handshake each"""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=REGOS_MAX_CONNECTIONS, ttl_dns_cache=300)
+        )
+    return _session
+
+
+async def close_regos_session():
+    """Close the shared session (called from the app lifespan)"""
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+
+async def regos_async_api_request(endpoint: str, request_data: dict | list | None, token: str,
+                                  timeout_seconds: int = 30, raw_body: bytes | None = None) -> dict:
     """
     Make an asynchronous request to the REGOS API.
 
@@ -16,6 +39,7 @@ async def regos_async_api_request(endpoint: str, request_data: dict | list, toke
         request_data (dict | list): The data to send in the request body.
         token (str): Integration token.
         timeout_seconds (int): Timeout in seconds (default: 30).
+        raw_body (bytes | None): Already-encoded JSON body, sent as is instead of request_data.
 
     Returns:
         dict: The API response.
@@ -36,37 +60,40 @@ async def regos_async_api_request(endpoint: str, request_data: dict | list, toke
 
     try:
         # Make the POST request asynchronously with timeout
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.post(
-                    full_url,
-                    headers=headers,
-                    data=json.dumps(request_data)
-            ) as response:
-                # Check if response is successful (code 200)
-                if response.status == 200:
-                    data = await response.json()
-
-                    # Check if the API returned an error in the response body
-                    if not data.get("ok"):
-                        err_result = data.get("result", {})
-                        error_code = err_result.get("error", "Unknown")
-                        error_desc = err_result.get("description", "Unknown error")
-                        err_msg = f"REGOS API error: {error_code} - {error_desc}"
-
-                        logger.error(err_msg)
-                        raise HTTPException(status_code=400, detail=err_msg)
-
-                    # Check if the API returned a valid response
-                    result = data.get("result", "There is no result in response")
-                    if not isinstance(result, (dict, list)):
-                        raise HTTPException(status_code=502, detail=f"Invalid response from REGOS API: {result}")
-
-                    return data
-
-                else:
-                    err_msg = f"Error: API returned status code {response.status}"
-                    logger.info(err_msg)
-                    raise HTTPException(status_code=502, detail=f"REGOS API returned status code {response.status}")
+        async with _get_session().post(
+                full_url,
+                headers=headers,
+                data=raw_body if raw_body is not None else orjson.dumps(request_data),
+                timeout=timeout
+        ) as response:
+            # Check if response is successful (code 200)
+            if response.status == 200:
+                data = await response.json(loads=orjson.loads)
+
+                # Check if the API returned an error in the response body
+                if not data.get("ok"):
+                    err_result = data.get("result", {})
+                    error_code = err_result.get("error", "Unknown")
+                    error_desc = err_result.get("description", "Unknown error")
+                    err_msg = f"REGOS API error: {error_code} - {error_desc}"
+
+                    logger.error(err_msg)
+                    raise HTTPException(status_code=400, detail=err_msg)
+
+                # Check if the API returned a valid response
+                result = data.get("result", "There is no result in response")
+                if not isinstance(result, (dict, list)):
+                    raise HTTPException(status_code=502, detail=f"Invalid response from REGOS API: {result}")
+
+                return data
+
+            else:
+                err_msg = f"Error: API returned status code {response.status}"
+                logger.info(err_msg)
+                raise HTTPException(status_code=502, detail=f"REGOS API returned status code {response.status}")
+
+    except HTTPException:
+        raise
 
     except asyncio.TimeoutError:
         err_msg = f"REGOS API Error: Request timed out after {timeout_seconds} seconds"
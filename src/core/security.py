@@ -1,4 +1,9 @@
+import logging
 from datetime import datetime, timedelta
+from typing import Optional
+
+import orjson
+from cachetools import TTLCache
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
@@ -7,8 +12,89 @@ from src.models.user import User
 from src.auth.session import SessionManager
 from src.auth.user import UserService
 from src.core.conf import SESSION_EXPIRE_DAYS
+from src.core.redis_client import redis_client
 
 security = HTTPBearer()
+logger = logging.getLogger("DocVision")
+
+# Validated sessions are cached so most requests skip the session/user queries and
+# the activity UPDATE. Redis is shared by all workers; the local copy is kept short
+# because another worker's logout can only clear Redis.
+SESSION_CACHE_TTL = 60
+LOCAL_SESSION_CACHE_TTL = 5
+
+_local_sessions: TTLCache = TTLCache(maxsize=10_000, ttl=LOCAL_SESSION_CACHE_TTL)
+
+
+def _session_key(session_id: str) -> str:
+    return f"sess:{session_id}"
+
+
+def _user_version_key(user_id: str) -> str:
+    # Bumped to invalidate every cached session of a user at once
+    return f"sess_ver:{user_id}"
+
+
+async def _read_cached_session(user_id: str, session_id: str) -> tuple[Optional[tuple[User, datetime]], int]:
+    """Return the Redis entry if it is still current, plus the user's cache version"""
+    try:
+        version, cached = await redis_client.mget(_user_version_key(user_id), _session_key(session_id))
+    except Exception as e:
+        logger.warning(f"Session cache read failed: {e}")
+        return None, -1
+
+    version = int(version or 0)
+    if cached is None:
+        return None, version
+
+    entry = orjson.loads(cached)
+    if entry["version"] != version or entry["user"]["id"] != user_id:
+        return None, version
+    return (User.model_validate(entry["user"]), datetime.fromisoformat(entry["last_activity"])), version
+
+
+async def _write_cached_session(session_id: str, user: User, last_activity: datetime, version: int) -> None:
+    entry = {"version": version, "user": user.model_dump(mode="json"), "last_activity": last_activity.isoformat()}
+    try:
+        await redis_client.set(_session_key(session_id), orjson.dumps(entry), ex=SESSION_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"Session cache write failed: {e}")
+
+
+async def _drop_session(session_id: str) -> None:
+    try:
+        await redis_client.delete(_session_key(session_id))
+    except Exception as e:
+        logger.warning(f"Session cache invalidation failed: {e}")
+
+
+async def _bump_user_version(user_id: str) -> None:
+    try:
+        async with redis_client.pipeline() as pipe:
+            pipe.incr(_user_version_key(user_id))
+            # Only needs to outlive the session entries it guards
+            pipe.expire(_user_version_key(user_id), SESSION_CACHE_TTL * 2)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Session cache invalidation failed: {e}")
+
+
+async def invalidate_session_cache(session_id: str) -> None:
+    """Forget a cached session (call after deleting it)"""
+    _local_sessions.pop(session_id, None)
+    await _drop_session(session_id)
+
+
+async def invalidate_user_session_cache(user_id: str) -> None:
+    """Forget every cached session of a user (after logout-all or a profile change)"""
+    for session_id, (user, _) in list(_local_sessions.items()):
+        if user.id == user_id:
+            _local_sessions.pop(session_id, None)
+    await _bump_user_version(user_id)
+
+
+def _session_expired(last_activity: datetime) -> bool:
+    return datetime.utcnow() - last_activity > timedelta(days=SESSION_EXPIRE_DAYS)
 
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
@@ -25,32 +111,42 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
                 detail="Invalid token payload"
             )
 
-        # Check if session exists and is valid
-        session = await SessionManager.get_session(session_id)
-        if not session:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Session not found"
-            )
+        cached = _local_sessions.get(session_id)
+        version = -1
+        if cached is None:
+            cached, version = await _read_cached_session(user_id, session_id)
+            if cached is not None:
+                _local_sessions[session_id] = cached
+
+        if cached is not None and cached[0].id == user_id:
+            user, last_activity = cached
+            if not _session_expired(last_activity):
+                return user
 
-        # Check if session has expired (10 days of inactivity)
-        if datetime.utcnow() - session.last_activity > timedelta(days=SESSION_EXPIRE_DAYS):
-            await SessionManager.delete_session(session_id)
+        # Touch and read the session in one statement. Sessions past the inactivity limit
+        # are filtered out (and deleted by the hourly cleanup), so expired and unknown look the same
+        session = await SessionManager.touch_and_fetch(session_id)
+        if not session or session.user_id != user_id:
+            await invalidate_session_cache(session_id)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Session expired due to inactivity"
+                detail="Session not found or expired"
             )
 
-        # Get user
-        user = await UserService.get_user_by_id(user_id)
+        # Get user. Its local cache is only trusted under the current version, otherwise a
+        # stale user from before a change on another worker would be written back to Redis
+        user = await UserService.get_user_by_id(user_id, cache_version=version if version >= 0 else None)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User not found"
             )
 
-        # Update session activity
-        await SessionManager.update_activity(session_id)
+        last_activity = session.last_activity
+        _local_sessions[session_id] = (user, last_activity)
+        # Skip Redis if the version could not be read; the entry would never validate
+        if version >= 0:
+            await _write_cached_session(session_id, user, last_activity, version)
 
         return user
 
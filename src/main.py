@@ -1,5 +1,6 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from src.api.v1.routes import auth, users, billing, regos, tokens, system, ai, click, lang
 from src.core.conf import ENVIRONMENT
@@ -14,7 +15,9 @@ app = FastAPI(
     title="DocVision",
     description="DocVision - Extracting invoice file and load to Regos system",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # orjson encodes the response bodies (datetimes included) in C instead of json.dumps
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
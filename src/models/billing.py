@@ -127,4 +127,16 @@ class PaymentGetResponse(BaseModel):
     is_cancelled: bool
     created_at: datetime
 
-
+class ClickPayload(BaseModel):
+    """Form fields Click posts to /click/prepare and /click/complete.
+
+    Values stay strings: the signature is computed over them exactly as sent.
+    """
+    click_trans_id: str
+    service_id: str
+    merchant_trans_id: str
+    merchant_prepare_id: str = ""
+    amount: str
+    action: str
+    sign_time: str
+    sign_string: str
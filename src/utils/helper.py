@@ -1,3 +1,4 @@
+import asyncio
 import os
 from datetime import datetime, timezone, timedelta
 import json
@@ -294,6 +295,11 @@ def parse_json_strict(response: str) -> dict:
 
 async def compress_file(content: bytes, extension: str) -> bytes:
     """Compress file content"""
+    # Decoding and re-encoding a large image takes hundreds of ms; keep it off the event loop
+    return await asyncio.to_thread(_compress_file, content, extension)
+
+
+def _compress_file(content: bytes, extension: str) -> bytes:
     try:
         # Image formats that PIL can handle
         extension_lower = extension.lower()
@@ -1,23 +1,42 @@
 import ast
-import json
 import logging
+import os
+import re
+from functools import lru_cache
 
+import orjson
 import pdfplumber
 from typing import List, Tuple, Dict, Any
 
 logger = logging.getLogger("DocVision")
 
+_CODE_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+def file_signature(path: str) -> tuple[str, int, int]:
+    """Identify a file's current content by path, mtime and size (for memoization)"""
+    st = os.stat(path)
+    return path, st.st_mtime_ns, st.st_size
+
+
 def extract_pdf_tables_to_tuples(pdf_path: str) -> list[tuple]:
     """
     Extracts all table-like data from a PDF file and returns as a list of tuples.
     Each inner tuple represents one row (cells in order).
 
+    Results are memoized per file signature, so retries and fallbacks on the
+    same upload do not re-run pdfplumber's layout analysis.
+
     Args:
         pdf_path (str): Path to the PDF file.
 
     Returns:
         list[tuple]: A flat list of all rows from all detected tables.
     """
+    return _extract_pdf_tables_to_tuples(*file_signature(pdf_path))
+
+
+@lru_cache(maxsize=32)
+def _extract_pdf_tables_to_tuples(pdf_path: str, _mtime_ns: int, _size: int) -> list[tuple]:
     all_rows = []
 
     with pdfplumber.open(pdf_path) as pdf:
@@ -31,29 +50,6 @@ def extract_pdf_tables_to_tuples(pdf_path: str) -> list[tuple]:
 
     return all_rows
 
-def read_pdf_text(pdf_path: str) -> str:
-    """
-    Reads all text content from a PDF file and returns it as a single string.
-
-    Args:
-        pdf_path (str): Path to the PDF file.
-
-    Returns:
-        str: Combined text content of all pages.
-    """
-    full_text = []
-
-    with pdfplumber.open(pdf_path) as pdf:
-        for page_number, page in enumerate(pdf.pages, start=1):
-            text = page.extract_text()
-            if text:
-                full_text.append(f"{text}\n")
-
-    return "\n".join(full_text)
-
-from typing import List, Tuple, Dict, Any
-
-from typing import List, Tuple, Dict, Any
 
 def map_ai_response_to_dicts(
     table_rows: List[Tuple[Any, ...]],
@@ -109,20 +105,26 @@ def map_ai_response_to_dicts(
 def parse_string_to_list(string_data):
     """Convert string to list of dicts with multiple fallback methods"""
     try:
-        # Try ast.literal_eval first (handles Python syntax)
+        # Models are asked for JSON, so try the fast parser first
+        return orjson.loads(string_data)
+    except orjson.JSONDecodeError:
+        pass
+
+    try:
+        # Try ast.literal_eval (handles Python syntax)
         return ast.literal_eval(string_data)
     except (ValueError, SyntaxError):
-        # Remove markdown code blocks
-        cleaned_data = string_data.replace("```json", "").replace("```", "").strip()
+        # Remove markdown code fences around the payload
+        cleaned_data = _CODE_FENCE_RE.sub("", string_data.strip())
 
         try:
             # Try JSON parsing
-            return json.loads(cleaned_data)
-        except json.JSONDecodeError:
+            return orjson.loads(cleaned_data)
+        except orjson.JSONDecodeError:
             try:
                 # Try after replacing single quotes
-                return json.loads(cleaned_data.replace("'", '"'))
-            except json.JSONDecodeError:
+                return orjson.loads(cleaned_data.replace("'", '"'))
+            except orjson.JSONDecodeError:
                 logger.error("Failed to parse string")
                 return []
 
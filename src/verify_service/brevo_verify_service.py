@@ -3,7 +3,6 @@ import string
 import time
 import threading
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional, Tuple
 import requests
 from fastapi import BackgroundTasks, HTTPException, status
@@ -126,15 +125,12 @@ class BrevoVerify:
                 "created_at": int(time.time()),
             }
 
-        loop = asyncio.get_event_loop()
-        with ThreadPoolExecutor() as executor:
-            success, message = await loop.run_in_executor(
-                executor,
-                self._send_verification_email_sync,
-                send_to,
-                verification_code,
-                subject,
-            )
+        success, message = await asyncio.to_thread(
+            self._send_verification_email_sync,
+            send_to,
+            verification_code,
+            subject,
+        )
 
         if not success:
             with self._lock:
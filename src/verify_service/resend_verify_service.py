@@ -1,6 +1,7 @@
 import asyncio
 from datetime import datetime, timedelta
 import logging
+import time
 from random import randint
 
 from fastapi import HTTPException
@@ -19,6 +20,22 @@ resend.api_key = RESEND_API_KEY
 HTML_TEMPLATE = load_template_from_txt()
 VERIFICATION_EMAIL = F"no-reply@{RESEND_EMAIL_FROM}"
 
+# Resend's default API limit is 2 requests/second. Each sender waits out its share of
+# that budget after every request, so together they stay within it however fast the API answers
+RESEND_REQUESTS_PER_SECOND = 2
+EMAIL_WORKER_COUNT = 2
+EMAIL_SEND_INTERVAL = EMAIL_WORKER_COUNT / RESEND_REQUESTS_PER_SECOND
+# Past this many waiting emails a request sends its own instead of queueing it
+EMAIL_QUEUE_MAX_SIZE = 1000
+EMAIL_SEND_ATTEMPTS = 5
+EMAIL_RETRY_DELAY = 1
+EMAIL_QUEUE_DRAIN_TIMEOUT = 10
+
+_email_queue: asyncio.Queue = asyncio.Queue(maxsize=EMAIL_QUEUE_MAX_SIZE)
+_email_workers: list[asyncio.Task] = []
+# Failed sends waiting to be queued again; they don't hold a sender while they wait
+_email_retries: set[asyncio.Task] = set()
+
 async def add_code_into_db(recipient: str):
     async with DatabaseConnection() as db:
         code = str(randint(100000, 999999))
@@ -45,36 +62,108 @@ async def add_code_into_db(recipient: str):
         return code
 
 
+async def _send_email(recipient_email: str, code: str) -> str:
+    """Send one verification email (a single attempt) and return its Resend ID"""
+    html_body = format_message_from_template(
+        template_content=HTML_TEMPLATE,
+        verification_code=code,
+        app_name=APP_NAME
+    )
+
+    params: resend.Emails.SendParams = {
+        "from": VERIFICATION_EMAIL,  # e.g., "onboarding@yourdomain.com"
+        "to": [recipient_email],
+        "subject": f"{APP_NAME} - Verification Code",
+        "html": html_body,
+    }
+
+    # Use asyncio.to_thread to run sync Resend API in async context
+    email: resend.Email = await asyncio.to_thread(
+        resend.Emails.send,
+        params
+    )
+
+    logger.info(f"Verification email sent to {recipient_email}, ID: {email.get('id')}")
+    return email.get("id")
+
+
 async def send_verification_code(recipient_email: str, code: str):
-    for i in range(5):
+    for i in range(EMAIL_SEND_ATTEMPTS):
         try:
-            html_body = format_message_from_template(
-                template_content=HTML_TEMPLATE,
-                verification_code=code,
-                app_name=APP_NAME
-            )
+            email_id = await _send_email(recipient_email, code)
+            return {"ok": True, "result": "Email sent", "email_id": email_id}
+
+        except Exception as e:
+            logger.error(f"Attempt {i + 1} failed: {e}")
+            await asyncio.sleep(EMAIL_RETRY_DELAY)
+
+    return {"ok": False, "error": f"Failed to send after {EMAIL_SEND_ATTEMPTS} attempts."}
 
-            params: resend.Emails.SendParams = {
-                "from": VERIFICATION_EMAIL,  # e.g., "onboarding@yourdomain.com"
-                "to": [recipient_email],
-                "subject": f"{APP_NAME} - Verification Code",
-                "html": html_body,
-            }
-
-            # Use asyncio.to_thread to run sync Resend API in async context
-            email: resend.Email = await asyncio.to_thread(
-                resend.Emails.send,
-                params
-            )
 
-            logger.info(f"Verification email sent to {recipient_email}, ID: {email.get('id')}")
-            return {"ok": True, "result": "Email sent", "email_id": email.get("id")}
+async def enqueue_verification_code(recipient_email: str, code: str) -> None:
+    """Queue a verification email for the background senders (sent inline if the queue is full)"""
+    try:
+        _email_queue.put_nowait((recipient_email, code, 1))
+    except asyncio.QueueFull:
+        logger.warning(f"Verification email queue is full, sending to {recipient_email} inline")
+        result = await send_verification_code(recipient_email, code)
+        if not result.get("ok"):
+            logger.error(f"Verification email to {recipient_email} was not sent: {result.get('error')}")
 
+
+async def _retry_later(recipient_email: str, code: str, attempt: int) -> None:
+    await asyncio.sleep(EMAIL_RETRY_DELAY)
+    await _email_queue.put((recipient_email, code, attempt))
+
+
+def _schedule_retry(recipient_email: str, code: str, attempt: int) -> None:
+    task = asyncio.create_task(_retry_later(recipient_email, code, attempt))
+    _email_retries.add(task)
+    task.add_done_callback(_email_retries.discard)
+
+
+async def _email_worker():
+    while True:
+        recipient_email, code, attempt = await _email_queue.get()
+        started = time.monotonic()
+        try:
+            await _send_email(recipient_email, code)
         except Exception as e:
-            logger.error(f"Attempt {i + 1} failed: {e}")
-            await asyncio.sleep(1)
+            if attempt < EMAIL_SEND_ATTEMPTS:
+                logger.warning(f"Verification email to {recipient_email} failed (attempt {attempt}), retrying: {e}")
+                _schedule_retry(recipient_email, code, attempt + 1)
+            else:
+                logger.error(f"Verification email to {recipient_email} was not sent after {attempt} attempts: {e}")
+        finally:
+            _email_queue.task_done()
+
+        # Keep this sender to its share of the API rate limit
+        await asyncio.sleep(max(0.0, EMAIL_SEND_INTERVAL - (time.monotonic() - started)))
+
+
+def start_email_workers():
+    """Start the verification email senders (called from the app lifespan)"""
+    if not _email_workers:
+        _email_workers.extend(
+            asyncio.create_task(_email_worker(), name=f"email-worker-{i}") for i in range(EMAIL_WORKER_COUNT)
+        )
+
+
+async def stop_email_workers():
+    """Give queued emails a moment to go out, then stop the senders"""
+    try:
+        await asyncio.wait_for(_email_queue.join(), timeout=EMAIL_QUEUE_DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"Dropping {_email_queue.qsize()} queued verification emails on shutdown")
+
+    if _email_retries:
+        logger.warning(f"Dropping {len(_email_retries)} verification emails waiting to be retried on shutdown")
 
-    return {"ok": False, "error": "Failed to send after 5 attempts."}
+    tasks = [*_email_workers, *_email_retries]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _email_workers.clear()
 
 
 async def check_verification_code(recipient_email: str, code: str):
@@ -6,7 +6,6 @@ import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from fastapi import BackgroundTasks, HTTPException, status
-from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional, Tuple
 import threading
 import logging
@@ -192,15 +191,12 @@ class SMTPVerifyService:
         # await self._store_verification_code_redis(recipient_email, verification_code, expires_at)
 
         # Send email in thread pool to avoid blocking
-        loop = asyncio.get_event_loop()
-        with ThreadPoolExecutor() as executor:
-            success, message = await loop.run_in_executor(
-                executor,
-                self._send_verification_email_sync,
-                send_to,
-                verification_code,
-                subject
-            )
+        success, message = await asyncio.to_thread(
+            self._send_verification_email_sync,
+            send_to,
+            verification_code,
+            subject
+        )
 
         if not success:
             # Remove the stored code since email failed
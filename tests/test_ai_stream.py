@@ -0,0 +1,49 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+ai = pytest.importorskip("src.api.v1.routes.ai")
+
+
+class DisconnectedRequest:
+    async def is_disconnected(self) -> bool:
+        return True
+
+
+async def _slow_model_call(*args, **kwargs):
+    await asyncio.sleep(60)
+    return {"ok": True}
+
+
+async def _collect(stream) -> list[bytes]:
+    return [frame async for frame in stream]
+
+
+def test_detect_columns_stream_stops_quietly_on_disconnect():
+    async def run():
+        with patch.object(ai.SubscriptionService, "save_ai_usage_operation", AsyncMock(return_value={"ok": True})), \
+                patch.object(ai, "detect_excel_columns_gemini", _slow_model_call), \
+                patch.object(ai.logger, "error") as log_error:
+            frames = await _collect(ai.detect_columns_stream("a;b", SimpleNamespace(id="u1"), DisconnectedRequest()))
+        return frames, log_error
+
+    frames, log_error = asyncio.run(run())
+
+    assert frames == [ai.SSE_CHECKING_SUBSCRIPTION, ai.SSE_DETECTING_COLUMNS]
+    log_error.assert_not_called()
+
+
+def test_ai_match_products_stream_stops_quietly_on_disconnect():
+    async def run():
+        with patch.object(ai.SubscriptionService, "save_ai_usage_operation", AsyncMock(return_value={"ok": True})), \
+                patch.object(ai, "ai_match_products", _slow_model_call), \
+                patch.object(ai.logger, "error") as log_error:
+            frames = await _collect(ai.ai_match_products_stream("[]", "[]", SimpleNamespace(id="u1"), DisconnectedRequest()))
+        return frames, log_error
+
+    frames, log_error = asyncio.run(run())
+
+    assert frames == [ai.SSE_CHECKING_SUBSCRIPTION, ai.SSE_DETECTING_MATCHES]
+    log_error.assert_not_called()